@@ -0,0 +1,26 @@
+"""Add submission id to quiz results for idempotent write-behind inserts
+
+Revision ID: 5d0c8e3b7a19
+Revises: c37a5e81d9f2
+Create Date: 2026-10-18 17:41:08.215630
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d0c8e3b7a19'
+down_revision = 'c37a5e81d9f2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('quiz_results', sa.Column('submission_id', sa.String(length=32), nullable=True))
+    op.create_unique_constraint('quiz_results_submission_id_key', 'quiz_results', ['submission_id'])
+
+
+def downgrade() -> None:
+    op.drop_constraint('quiz_results_submission_id_key', 'quiz_results', type_='unique')
+    op.drop_column('quiz_results', 'submission_id')
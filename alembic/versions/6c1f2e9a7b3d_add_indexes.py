@@ -0,0 +1,46 @@
+"""Add indexes for foreign keys and result filters
+
+Revision ID: 6c1f2e9a7b3d
+Revises: a4b92ac272ff
+Create Date: 2026-10-18 10:12:41.527304
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6c1f2e9a7b3d'
+down_revision = 'a4b92ac272ff'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute('DELETE FROM quizzes_questions a USING quizzes_questions b '
+               'WHERE a.quiz_id = b.quiz_id AND a.question_id = b.question_id AND a.id > b.id')
+    op.execute('DELETE FROM questions_categories a USING questions_categories b '
+               'WHERE a.question_id = b.question_id AND a.category_id = b.category_id AND a.id > b.id')
+
+    op.create_unique_constraint('uq_quizzes_questions_quiz_id_question_id', 'quizzes_questions',
+                                ['quiz_id', 'question_id'])
+    op.create_index('ix_quizzes_questions_question_id', 'quizzes_questions', ['question_id'])
+    op.create_unique_constraint('uq_questions_categories_question_id_category_id', 'questions_categories',
+                                ['question_id', 'category_id'])
+    op.create_index('ix_questions_categories_category_id', 'questions_categories', ['category_id'])
+    op.create_index('ix_answers_question_id', 'answers', ['question_id'])
+    op.create_index('ix_quiz_results_quiz_id_finished_at_id', 'quiz_results', ['quiz_id', 'finished_at', 'id'])
+    op.create_index('ix_quiz_results_user_email_finished_at_id', 'quiz_results',
+                    ['user_email', 'finished_at', 'id'])
+    op.create_index('ix_quiz_results_finished_at_id', 'quiz_results', ['finished_at', 'id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_quiz_results_finished_at_id', table_name='quiz_results')
+    op.drop_index('ix_quiz_results_user_email_finished_at_id', table_name='quiz_results')
+    op.drop_index('ix_quiz_results_quiz_id_finished_at_id', table_name='quiz_results')
+    op.drop_index('ix_answers_question_id', table_name='answers')
+    op.drop_index('ix_questions_categories_category_id', table_name='questions_categories')
+    op.drop_constraint('uq_questions_categories_question_id_category_id', 'questions_categories', type_='unique')
+    op.drop_index('ix_quizzes_questions_question_id', table_name='quizzes_questions')
+    op.drop_constraint('uq_quizzes_questions_quiz_id_question_id', 'quizzes_questions', type_='unique')
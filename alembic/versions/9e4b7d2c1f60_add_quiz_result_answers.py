@@ -0,0 +1,32 @@
+"""Add quiz_result_answers table
+
+Revision ID: 9e4b7d2c1f60
+Revises: 6c1f2e9a7b3d
+Create Date: 2026-10-18 13:47:05.118432
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9e4b7d2c1f60'
+down_revision = '6c1f2e9a7b3d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('quiz_result_answers',
+    sa.Column('result_id', sa.Integer(), nullable=False),
+    sa.Column('question_id', sa.Integer(), nullable=False),
+    sa.Column('user_answer_id', sa.Integer(), nullable=False),
+    sa.Column('correct_answer_id', sa.Integer(), nullable=True),
+    sa.Column('is_correct', sa.Boolean(), server_default=sa.text('false'), nullable=False),
+    sa.ForeignKeyConstraint(['result_id'], ['quiz_results.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('result_id', 'question_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('quiz_result_answers')
@@ -0,0 +1,44 @@
+"""Store selected and correct answer sets with a score per result answer
+
+Revision ID: c37a5e81d9f2
+Revises: 9e4b7d2c1f60
+Create Date: 2026-10-18 16:02:33.904127
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'c37a5e81d9f2'
+down_revision = '9e4b7d2c1f60'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('quiz_result_answers', sa.Column('user_answer_ids', postgresql.ARRAY(sa.Integer()),
+                                                   server_default=sa.text("'{}'"), nullable=False))
+    op.add_column('quiz_result_answers', sa.Column('correct_answer_ids', postgresql.ARRAY(sa.Integer()),
+                                                   server_default=sa.text("'{}'"), nullable=False))
+    op.add_column('quiz_result_answers', sa.Column('score', sa.Float(), server_default=sa.text('0.0'),
+                                                   nullable=False))
+    op.execute("UPDATE quiz_result_answers SET "
+               "user_answer_ids = ARRAY[user_answer_id], "
+               "correct_answer_ids = CASE WHEN correct_answer_id IS NULL THEN '{}' ELSE ARRAY[correct_answer_id] END, "
+               "score = CASE WHEN is_correct THEN 1.0 ELSE 0.0 END")
+    op.drop_column('quiz_result_answers', 'correct_answer_id')
+    op.drop_column('quiz_result_answers', 'user_answer_id')
+
+
+def downgrade() -> None:
+    op.add_column('quiz_result_answers', sa.Column('user_answer_id', sa.Integer(), nullable=True))
+    op.add_column('quiz_result_answers', sa.Column('correct_answer_id', sa.Integer(), nullable=True))
+    op.execute("UPDATE quiz_result_answers SET "
+               "user_answer_id = user_answer_ids[1], correct_answer_id = correct_answer_ids[1]")
+    op.execute("DELETE FROM quiz_result_answers WHERE user_answer_id IS NULL")
+    op.alter_column('quiz_result_answers', 'user_answer_id', nullable=False)
+    op.drop_column('quiz_result_answers', 'score')
+    op.drop_column('quiz_result_answers', 'correct_answer_ids')
+    op.drop_column('quiz_result_answers', 'user_answer_ids')
@@ -0,0 +1,62 @@
+"""Add per-quiz and per-question statistics rollups
+
+Revision ID: e81f4a6c2b57
+Revises: 5d0c8e3b7a19
+Create Date: 2026-10-18 18:26:51.730412
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e81f4a6c2b57'
+down_revision = '5d0c8e3b7a19'
+branch_labels = None
+depends_on = None
+
+SCORE_PERCENT = 'CASE WHEN max_score > 0 THEN LEAST(GREATEST(user_score / max_score * 100, 0), 100) ELSE 0 END'
+
+
+def upgrade() -> None:
+    op.create_table('quiz_stats',
+                    sa.Column('quiz_id', sa.Integer(), nullable=False),
+                    sa.Column('attempts', sa.Integer(), server_default=sa.text('0'), nullable=False),
+                    sa.Column('score_sum', sa.Float(), server_default=sa.text('0.0'), nullable=False),
+                    sa.Column('percent_sum', sa.Float(), server_default=sa.text('0.0'), nullable=False),
+                    sa.Column('last_finished_at', sa.DateTime(), nullable=True),
+                    sa.ForeignKeyConstraint(['quiz_id'], ['quizzes.id'], ondelete='CASCADE'),
+                    sa.PrimaryKeyConstraint('quiz_id'))
+    op.create_table('quiz_score_histogram',
+                    sa.Column('quiz_id', sa.Integer(), nullable=False),
+                    sa.Column('bucket', sa.Integer(), nullable=False),
+                    sa.Column('attempts', sa.Integer(), server_default=sa.text('0'), nullable=False),
+                    sa.ForeignKeyConstraint(['quiz_id'], ['quizzes.id'], ondelete='CASCADE'),
+                    sa.PrimaryKeyConstraint('quiz_id', 'bucket'))
+    op.create_table('question_stats',
+                    sa.Column('quiz_id', sa.Integer(), nullable=False),
+                    sa.Column('question_id', sa.Integer(), nullable=False),
+                    sa.Column('attempts', sa.Integer(), server_default=sa.text('0'), nullable=False),
+                    sa.Column('correct', sa.Integer(), server_default=sa.text('0'), nullable=False),
+                    sa.Column('score_sum', sa.Float(), server_default=sa.text('0.0'), nullable=False),
+                    sa.ForeignKeyConstraint(['quiz_id'], ['quizzes.id'], ondelete='CASCADE'),
+                    sa.PrimaryKeyConstraint('quiz_id', 'question_id'))
+    op.create_index('ix_question_stats_question_id', 'question_stats', ['question_id'])
+
+    op.execute('INSERT INTO quiz_stats (quiz_id, attempts, score_sum, percent_sum, last_finished_at) '
+               f'SELECT quiz_id, count(*), sum(user_score), sum({SCORE_PERCENT}), max(finished_at) '
+               'FROM quiz_results WHERE quiz_id IS NOT NULL GROUP BY quiz_id')
+    op.execute('INSERT INTO quiz_score_histogram (quiz_id, bucket, attempts) '
+               f'SELECT quiz_id, floor({SCORE_PERCENT})::integer, count(*) '
+               'FROM quiz_results WHERE quiz_id IS NOT NULL GROUP BY 1, 2')
+    op.execute('INSERT INTO question_stats (quiz_id, question_id, attempts, correct, score_sum) '
+               'SELECT r.quiz_id, a.question_id, count(*), count(*) FILTER (WHERE a.is_correct), sum(a.score) '
+               'FROM quiz_result_answers a JOIN quiz_results r ON r.id = a.result_id '
+               'WHERE r.quiz_id IS NOT NULL GROUP BY 1, 2')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_question_stats_question_id', table_name='question_stats')
+    op.drop_table('question_stats')
+    op.drop_table('quiz_score_histogram')
+    op.drop_table('quiz_stats')
@@ -0,0 +1,36 @@
+"""Add stored per-question item analysis
+
+Revision ID: f3a9c1d74e28
+Revises: e81f4a6c2b57
+Create Date: 2026-10-18 19:08:17.462903
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3a9c1d74e28'
+down_revision = 'e81f4a6c2b57'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('question_analysis',
+                    sa.Column('quiz_id', sa.Integer(), nullable=False),
+                    sa.Column('question_id', sa.Integer(), nullable=False),
+                    sa.Column('responses', sa.Integer(), nullable=False),
+                    sa.Column('difficulty', sa.Float(), nullable=False),
+                    sa.Column('discrimination', sa.Float(), nullable=True),
+                    sa.Column('discrimination_index', sa.Float(), nullable=True),
+                    sa.Column('distractors', postgresql.JSONB(astext_type=sa.Text()),
+                              server_default=sa.text("'{}'"), nullable=False),
+                    sa.Column('analyzed_at', sa.DateTime(), nullable=False),
+                    sa.ForeignKeyConstraint(['quiz_id'], ['quizzes.id'], ondelete='CASCADE'),
+                    sa.PrimaryKeyConstraint('quiz_id', 'question_id'))
+
+
+def downgrade() -> None:
+    op.drop_table('question_analysis')
@@ -0,0 +1,98 @@
+from databases import Database
+from datetime import datetime
+from starlette.concurrency import run_in_threadpool
+import numpy as np
+import logging
+
+from database import queries
+from database.cache import Cache
+from utils import form_question_analysis_lock_key
+
+logger = logging.getLogger(__name__)
+
+UPPER_LOWER_GROUP_FRACTION = 0.27
+
+
+def to_optional_float(value):
+    return None if np.isnan(value) else float(value)
+
+
+def group_difficulty(correct: np.ndarray, answered: np.ndarray, rows: np.ndarray):
+    responses = answered[rows].sum(axis=0)
+    return np.divide(correct[rows].sum(axis=0), responses, out=np.full(responses.shape, np.nan), where=responses > 0)
+
+
+def analyze_item_responses(result_ids, question_ids, scores, is_correct, pick_question_ids, pick_answer_ids,
+                           key_question_ids, key_answer_ids):
+    result_ids = np.asarray(result_ids, dtype=np.int64)
+    question_ids = np.asarray(question_ids, dtype=np.int64)
+
+    if not result_ids.size:
+        return []
+
+    attempts, rows = np.unique(result_ids, return_inverse=True)
+    questions, columns = np.unique(question_ids, return_inverse=True)
+    shape = (attempts.size, questions.size)
+
+    answered = np.zeros(shape, dtype=bool)
+    answered[rows, columns] = True
+    correct = np.zeros(shape)
+    correct[rows, columns] = np.asarray(is_correct, dtype=np.float64)
+    score = np.zeros(shape)
+    score[rows, columns] = np.asarray(scores, dtype=np.float64)
+
+    responses = answered.sum(axis=0)
+    difficulty = correct.sum(axis=0) / responses
+
+    totals = score.sum(axis=1)
+    rest = (totals[:, np.newaxis] - score) * answered
+    correct_deviation = (correct - difficulty) * answered
+    rest_deviation = (rest - rest.sum(axis=0) / responses) * answered
+    spread = np.sqrt((correct_deviation ** 2).sum(axis=0) * (rest_deviation ** 2).sum(axis=0))
+    covariance = (correct_deviation * rest_deviation).sum(axis=0)
+    discrimination = np.divide(covariance, spread, out=np.full(spread.shape, np.nan), where=spread > 0)
+
+    group_size = max(1, int(np.ceil(attempts.size * UPPER_LOWER_GROUP_FRACTION)))
+    order = np.argsort(totals, kind='stable')
+    discrimination_index = group_difficulty(correct, answered, order[-group_size:]) - \
+        group_difficulty(correct, answered, order[:group_size])
+
+    picks = (np.asarray(pick_question_ids, dtype=np.int64) << 32) | np.asarray(pick_answer_ids, dtype=np.int64)
+    keys = (np.asarray(key_question_ids, dtype=np.int64) << 32) | np.asarray(key_answer_ids, dtype=np.int64)
+    distractor_pairs, distractor_counts = np.unique(picks[~np.isin(picks, keys)], return_counts=True)
+
+    distractors = [dict() for _ in range(questions.size)]
+    distractor_columns = np.searchsorted(questions, distractor_pairs >> 32)
+    for column, answer_id, count in zip(distractor_columns.tolist(), (distractor_pairs & 0xFFFFFFFF).tolist(),
+                                        distractor_counts.tolist()):
+        distractors[column][str(answer_id)] = count
+
+    return [
+        {
+            'question_id': int(questions[column]),
+            'responses': int(responses[column]),
+            'difficulty': float(difficulty[column]),
+            'discrimination': to_optional_float(discrimination[column]),
+            'discrimination_index': to_optional_float(discrimination_index[column]),
+            'distractors': distractors[column]
+        }
+        for column in range(questions.size)
+    ]
+
+
+async def run_quiz_analysis(quiz_id: int, db: Database, cache: Cache):
+    try:
+        responses, picks, keys = await queries.get_quiz_analysis_data(quiz_id, db)
+        analysis_data = await run_in_threadpool(
+            analyze_item_responses, responses['result_ids'], responses['question_ids'], responses['scores'],
+            responses['is_correct'], picks['question_ids'], picks['answer_ids'], keys['question_ids'],
+            keys['answer_ids']
+        )
+
+        analyzed_at = datetime.now()
+        await queries.save_question_analysis(quiz_id, [{**row, 'quiz_id': quiz_id, 'analyzed_at': analyzed_at}
+                                                       for row in analysis_data], db)
+    except Exception:
+        logger.exception('Item analysis of quiz %s failed', quiz_id)
+    finally:
+        await cache.delete(form_question_analysis_lock_key(quiz_id))
@@ -15,6 +15,13 @@ class Settings(BaseSettings):
 
     POSTGRES_DATABASE_URL: PostgresDsn = f'postgresql://{PG_USER}:{PG_PASSWORD}@{PG_HOST}:{PG_PORT}/{PG_DB}'
 
+    PG_POOL_MIN_SIZE: int = int(os.environ.get('PG_POOL_MIN_SIZE', 5))
+    PG_POOL_MAX_SIZE: int = int(os.environ.get('PG_POOL_MAX_SIZE', 20))
+    PG_STATEMENT_CACHE_SIZE: int = int(os.environ.get('PG_STATEMENT_CACHE_SIZE', 100))
+    PG_COMMAND_TIMEOUT: float = float(os.environ.get('PG_COMMAND_TIMEOUT', 30))
+    PG_MAX_QUERIES: int = int(os.environ.get('PG_MAX_QUERIES', 50000))
+    PG_MAX_INACTIVE_CONNECTION_LIFETIME: float = float(os.environ.get('PG_MAX_INACTIVE_CONNECTION_LIFETIME', 300))
+
     # [CACHE]
     REDIS_PASSWORD: str = os.environ.get('REDIS_PASSWORD')
     REDIS_HOST: str = os.environ.get('REDIS_HOST')
@@ -23,6 +30,61 @@ class Settings(BaseSettings):
 
     REDIS_DATABASE_URL: RedisDsn = f'redis://:{REDIS_PASSWORD}@{REDIS_HOST}:{REDIS_PORT}/{REDIS_DB}'
 
+    CACHE_BACKEND: str = os.environ.get('CACHE_BACKEND', 'redis')
+    REDIS_MAX_CONNECTIONS: int = int(os.environ.get('REDIS_MAX_CONNECTIONS', 50))
+    REDIS_SOCKET_TIMEOUT: float = float(os.environ.get('REDIS_SOCKET_TIMEOUT', 1.0))
+    REDIS_SOCKET_CONNECT_TIMEOUT: float = float(os.environ.get('REDIS_SOCKET_CONNECT_TIMEOUT', 1.0))
+    REDIS_HEALTH_CHECK_INTERVAL: int = int(os.environ.get('REDIS_HEALTH_CHECK_INTERVAL', 30))
+    REDIS_RETRIES: int = int(os.environ.get('REDIS_RETRIES', 2))
+
+    CATALOG_CACHE_TTL: int = int(os.environ.get('CATALOG_CACHE_TTL', 300))
+    CATALOG_LOCAL_CACHE_TTL: int = int(os.environ.get('CATALOG_LOCAL_CACHE_TTL', 10))
+    CATALOG_LOCAL_CACHE_MAX_ENTRIES: int = int(os.environ.get('CATALOG_LOCAL_CACHE_MAX_ENTRIES', 256))
+    CATALOG_INVALIDATION_CHANNEL: str = os.environ.get('CATALOG_INVALIDATION_CHANNEL', 'catalog-invalidations')
+
+    QUIZ_QUESTIONS_CACHE_TTL: int = int(os.environ.get('QUIZ_QUESTIONS_CACHE_TTL', 3600))
+    RESULT_DETAILS_CACHE_TTL: int = int(os.environ.get('RESULT_DETAILS_CACHE_TTL', 172800))
+    ANSWER_KEY_CACHE_TTL: int = int(os.environ.get('ANSWER_KEY_CACHE_TTL', 86400))
+    ANSWER_KEY_CACHE_MAX_ENTRIES: int = int(os.environ.get('ANSWER_KEY_CACHE_MAX_ENTRIES', 1000))
+    QUIZ_VERSION_CACHE_TTL: int = int(os.environ.get('QUIZ_VERSION_CACHE_TTL', 86400))
+
+    # [GRADING]
+    GRADING_SCORING_MODE: str = os.environ.get('GRADING_SCORING_MODE', 'all_or_nothing')
+    GRADING_NEGATIVE_MARK: float = float(os.environ.get('GRADING_NEGATIVE_MARK', 0.25))
+
+    # [RESULTS WRITE-BEHIND]
+    RESULTS_WRITE_BEHIND: bool = os.environ.get('RESULTS_WRITE_BEHIND', 'false').lower() == 'true'
+    RESULTS_STREAM: str = os.environ.get('RESULTS_STREAM', 'quiz-results:::stream')
+    RESULTS_STREAM_GROUP: str = os.environ.get('RESULTS_STREAM_GROUP', 'result-writers')
+    RESULTS_BATCH_SIZE: int = int(os.environ.get('RESULTS_BATCH_SIZE', 500))
+    RESULTS_BATCH_WINDOW_MS: int = int(os.environ.get('RESULTS_BATCH_WINDOW_MS', 200))
+    RESULTS_WRITER_BLOCK_MS: int = int(os.environ.get('RESULTS_WRITER_BLOCK_MS', 500))
+    RESULTS_WRITER_CLAIM_IDLE_MS: int = int(os.environ.get('RESULTS_WRITER_CLAIM_IDLE_MS', 60000))
+
+    # [IDEMPOTENCY]
+    IDEMPOTENCY_TTL: int = int(os.environ.get('IDEMPOTENCY_TTL', 3600))
+    IDEMPOTENCY_PENDING_TTL: int = int(os.environ.get('IDEMPOTENCY_PENDING_TTL', 30))
+    IDEMPOTENCY_POLL_INTERVAL: float = float(os.environ.get('IDEMPOTENCY_POLL_INTERVAL', 0.05))
+
+    # [QUIZ SESSIONS]
+    QUIZ_SESSION_TIME_LIMIT: int = int(os.environ.get('QUIZ_SESSION_TIME_LIMIT', 1800))
+    QUIZ_SESSION_GRACE_PERIOD: int = int(os.environ.get('QUIZ_SESSION_GRACE_PERIOD', 300))
+    QUIZ_SESSION_MAX_QUESTIONS: int = int(os.environ.get('QUIZ_SESSION_MAX_QUESTIONS', 100))
+
+    # [STATS]
+    STATS_PASS_PERCENT: float = float(os.environ.get('STATS_PASS_PERCENT', 60))
+    STATS_FLUSH_INTERVAL_MS: int = int(os.environ.get('STATS_FLUSH_INTERVAL_MS', 1000))
+    QUESTION_ANALYSIS_LOCK_TTL: int = int(os.environ.get('QUESTION_ANALYSIS_LOCK_TTL', 900))
+
+    # [LEADERBOARDS]
+    LEADERBOARD_DEFAULT_LIMIT: int = int(os.environ.get('LEADERBOARD_DEFAULT_LIMIT', 10))
+    LEADERBOARD_MAX_LIMIT: int = int(os.environ.get('LEADERBOARD_MAX_LIMIT', 100))
+    LEADERBOARD_REBUILD_CHUNK_SIZE: int = int(os.environ.get('LEADERBOARD_REBUILD_CHUNK_SIZE', 1000))
+
+    # [PAGINATION]
+    RESULTS_PAGE_DEFAULT_LIMIT: int = int(os.environ.get('RESULTS_PAGE_DEFAULT_LIMIT', 100))
+    RESULTS_PAGE_MAX_LIMIT: int = int(os.environ.get('RESULTS_PAGE_MAX_LIMIT', 1000))
+
     # [AUTH0]
     DOMAIN: str = os.environ.get('DOMAIN')
     AUDIENCE: str = os.environ.get('AUDIENCE')
@@ -32,6 +94,15 @@ class Settings(BaseSettings):
     CLIENT_SECRET: str = os.environ.get('CLIENT_SECRET')
     CONNECTION: str = os.environ.get('CONNECTION')
 
+    JWKS_URL: str = os.environ.get('JWKS_URL', f'https://{DOMAIN}/.well-known/jwks.json')
+    JWKS_CACHE_TTL: int = int(os.environ.get('JWKS_CACHE_TTL', 3600))
+    JWKS_REFRESH_INTERVAL: int = int(os.environ.get('JWKS_REFRESH_INTERVAL', 600))
+    JWKS_MIN_REFRESH_INTERVAL: int = int(os.environ.get('JWKS_MIN_REFRESH_INTERVAL', 30))
+    JWKS_FETCH_TIMEOUT: float = float(os.environ.get('JWKS_FETCH_TIMEOUT', 5.0))
+
+    TOKEN_CACHE_MAX_ENTRIES: int = int(os.environ.get('TOKEN_CACHE_MAX_ENTRIES', 10000))
+    TOKEN_CACHE_TTL: int = int(os.environ.get('TOKEN_CACHE_TTL', 300))
+
     class Config:
         case_sensitive = True
 
@@ -0,0 +1,638 @@
+from aioredis import Redis, from_url
+from aioredis.exceptions import ConnectionError, TimeoutError, RedisError
+from typing import Dict, List, Optional
+from functools import wraps
+from fnmatch import fnmatchcase
+from time import monotonic, time
+import logging
+import asyncio
+import orjson
+
+from core.congif import settings
+from utils import LRUCache
+
+logger = logging.getLogger(__name__)
+
+UPDATE_BEST_SCORE_SCRIPT = """
+local current = redis.call('ZSCORE', KEYS[1], ARGV[1])
+local score = tonumber(ARGV[2])
+if current and tonumber(current) >= score then
+    return 0
+end
+redis.call('ZADD', KEYS[1], score, ARGV[1])
+redis.call('ZINCRBY', KEYS[2], score - (tonumber(current) or 0), ARGV[1])
+return 1
+"""
+
+HSET_IF_EXISTS_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+return 1
+"""
+
+POP_HASH_SCRIPT = """
+local fields = redis.call('HGETALL', KEYS[1])
+redis.call('DEL', KEYS[1])
+return fields
+"""
+
+
+class Cache:
+    def __init__(self, client: Redis, retries: int = 2, retry_backoff: float = 0.05, listen_client: Redis = None):
+        self.client = client
+        self.listen_client = listen_client or client
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+
+    async def _call(self, command: str, *args, **kwargs):
+        for attempt in range(self.retries + 1):
+            try:
+                return await getattr(self.client, command)(*args, **kwargs)
+            except (ConnectionError, TimeoutError):
+                if attempt == self.retries:
+                    raise
+                await asyncio.sleep(self.retry_backoff * (attempt + 1))
+
+    async def get(self, key: str):
+        return await self._call('get', key)
+
+    async def set(self, key: str, value, ex: int = None, nx: bool = False):
+        return await self._call('set', key, value, ex=ex, nx=nx)
+
+    async def delete(self, *keys: str):
+        return await self._call('delete', *keys)
+
+    async def incr(self, key: str, amount: int = 1):
+        return await self._call('incr', key, amount)
+
+    async def expire(self, key: str, ex: int):
+        return await self._call('expire', key, ex)
+
+    async def mget(self, keys: List[str]):
+        if not keys:
+            return []
+        return await self._call('mget', keys)
+
+    async def hget(self, name: str, key: str):
+        return await self._call('hget', name, key)
+
+    async def hset(self, name: str, key: str = None, value=None, mapping: Dict[str, bytes] = None):
+        return await self._call('hset', name, key, value, mapping=mapping)
+
+    async def hmget(self, name: str, keys: List[str]):
+        return await self._call('hmget', name, keys)
+
+    async def hgetall(self, name: str):
+        return await self._call('hgetall', name)
+
+    async def publish(self, channel: str, message):
+        return await self._call('publish', channel, message)
+
+    async def zadd(self, name: str, mapping: Dict[str, float]):
+        return await self._call('zadd', name, mapping)
+
+    async def zrevrange(self, name: str, start: int, end: int, withscores: bool = False):
+        return await self._call('zrevrange', name, start, end, withscores=withscores)
+
+    async def zrevrank(self, name: str, member: str):
+        return await self._call('zrevrank', name, member)
+
+    async def zscore(self, name: str, member: str):
+        return await self._call('zscore', name, member)
+
+    async def rename(self, source: str, destination: str):
+        return await self._call('rename', source, destination)
+
+    async def zunionstore(self, destination: str, keys: List[str], aggregate: str = None):
+        return await self._call('zunionstore', destination, keys, aggregate=aggregate)
+
+    async def scan_iter(self, match: str):
+        async for key in self.client.scan_iter(match=match):
+            yield key
+
+    async def eval(self, script: str, numkeys: int, *keys_and_args):
+        return await self._call('eval', script, numkeys, *keys_and_args)
+
+    async def xadd(self, name: str, fields: Dict[str, bytes]):
+        return await self._call('xadd', name, fields)
+
+    async def xgroup_create(self, name: str, group: str, id: str = '0', mkstream: bool = True):
+        return await self._call('xgroup_create', name, group, id, mkstream=mkstream)
+
+    async def xreadgroup(self, group: str, consumer: str, streams: Dict[str, str], count: int = None,
+                         block: int = None):
+        return await self._call('xreadgroup', group, consumer, streams, count=count, block=block)
+
+    async def xack(self, name: str, group: str, *ids):
+        return await self._call('xack', name, group, *ids)
+
+    async def xdel(self, name: str, *ids):
+        return await self._call('xdel', name, *ids)
+
+    async def xlen(self, name: str):
+        return await self._call('xlen', name)
+
+    async def xpending(self, name: str, group: str):
+        return await self._call('xpending', name, group)
+
+    async def xpending_range(self, name: str, group: str, count: int):
+        return await self._call('xpending_range', name, group, '-', '+', count)
+
+    async def xclaim(self, name: str, group: str, consumer: str, min_idle_time: int, ids: List):
+        return await self._call('xclaim', name, group, consumer, min_idle_time, ids)
+
+    async def listen(self, channel: str):
+        pubsub = self.listen_client.pubsub()
+        await pubsub.subscribe(channel)
+
+        try:
+            async for message in pubsub.listen():
+                if message['type'] == 'message':
+                    yield message['data']
+        finally:
+            await pubsub.unsubscribe(channel)
+            await pubsub.close()
+
+    async def mset(self, mapping: Dict[str, bytes], ex: int = None):
+        async with self.pipeline() as pipe:
+            for key, value in mapping.items():
+                pipe.set(key, value, ex=ex)
+            return await pipe.execute()
+
+    def pipeline(self):
+        return self.client.pipeline(transaction=False)
+
+    async def close(self):
+        for client in {self.client, self.listen_client}:
+            await client.close()
+            await client.connection_pool.disconnect()
+
+
+class FakePipeline:
+    def __init__(self, cache: 'FakeCache'):
+        self._cache = cache
+        self._commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        self._commands = []
+
+    def __getattr__(self, command: str):
+        method = getattr(self._cache, command)
+
+        def queue(*args, **kwargs):
+            self._commands.append((method, args, kwargs))
+            return self
+
+        return queue
+
+    async def execute(self):
+        commands, self._commands = self._commands, []
+        return [await method(*args, **kwargs) for method, args, kwargs in commands]
+
+
+class FakeStream:
+    def __init__(self):
+        self.entries = dict()
+        self.groups = dict()
+        self.last_id = (0, 0)
+        self.added = asyncio.Event()
+
+    def next_id(self):
+        milliseconds = int(time() * 1000)
+        sequence = self.last_id[1] + 1 if milliseconds <= self.last_id[0] else 0
+        self.last_id = (max(milliseconds, self.last_id[0]), sequence)
+        return f'{self.last_id[0]}-{self.last_id[1]}'.encode()
+
+
+class FakeCache:
+    def __init__(self):
+        self._data = dict()
+        self._expires_at = dict()
+        self._subscribers = dict()
+        self._streams: Dict[str, FakeStream] = dict()
+
+    @staticmethod
+    def _encode(value):
+        if isinstance(value, bytes):
+            return value
+        return str(value).encode()
+
+    def _get(self, key: str) -> Optional[bytes]:
+        expires_at = self._expires_at.get(key)
+
+        if expires_at is not None and expires_at <= monotonic():
+            self._data.pop(key, None)
+            self._expires_at.pop(key, None)
+
+        return self._data.get(key)
+
+    async def get(self, key: str):
+        return self._get(key)
+
+    async def set(self, key: str, value, ex: int = None, nx: bool = False):
+        if nx and self._get(key) is not None:
+            return None
+
+        self._data[key] = self._encode(value)
+        self._expires_at.pop(key, None)
+        if ex:
+            self._expires_at[key] = monotonic() + ex
+        return True
+
+    async def delete(self, *keys: str):
+        deleted = 0
+        for key in keys:
+            if self._get(key) is not None:
+                deleted += 1
+            self._data.pop(key, None)
+            self._expires_at.pop(key, None)
+        return deleted
+
+    async def incr(self, key: str, amount: int = 1):
+        value = int(self._get(key) or 0) + amount
+        self._data[key] = self._encode(value)
+        return value
+
+    async def expire(self, key: str, ex: int):
+        if self._get(key) is None:
+            return False
+        self._expires_at[key] = monotonic() + ex
+        return True
+
+    async def mget(self, keys: List[str]):
+        return [self._get(key) for key in keys]
+
+    async def hget(self, name: str, key: str):
+        return (self._get(name) or dict()).get(self._encode(key))
+
+    async def hset(self, name: str, key: str = None, value=None, mapping: Dict[str, bytes] = None):
+        if self._get(name) is None:
+            self._data[name] = dict()
+
+        items = dict(mapping or {})
+        if key is not None:
+            items[key] = value
+
+        added = 0
+        for field, field_value in items.items():
+            field = self._encode(field)
+            added += field not in self._data[name]
+            self._data[name][field] = self._encode(field_value)
+        return added
+
+    async def hmget(self, name: str, keys: List[str]):
+        fields = self._get(name) or dict()
+        return [fields.get(self._encode(key)) for key in keys]
+
+    async def hgetall(self, name: str):
+        return dict(self._get(name) or dict())
+
+    async def publish(self, channel: str, message):
+        queues = self._subscribers.get(channel, [])
+        for queue in queues:
+            queue.put_nowait(self._encode(message))
+        return len(queues)
+
+    async def listen(self, channel: str):
+        queue = asyncio.Queue()
+        self._subscribers.setdefault(channel, []).append(queue)
+
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self._subscribers[channel].remove(queue)
+
+    def _sorted_set(self, name: str) -> Dict[bytes, float]:
+        if self._get(name) is None:
+            self._data[name] = dict()
+        return self._data[name]
+
+    async def zadd(self, name: str, mapping: Dict[str, float]):
+        members = self._sorted_set(name)
+        added = 0
+        for member, score in mapping.items():
+            member = self._encode(member)
+            added += member not in members
+            members[member] = float(score)
+        return added
+
+    async def zincrby(self, name: str, amount: float, member: str):
+        members = self._sorted_set(name)
+        member = self._encode(member)
+        members[member] = members.get(member, 0.0) + float(amount)
+        return members[member]
+
+    def _ranked(self, name: str):
+        return sorted((self._get(name) or dict()).items(), key=lambda item: (item[1], item[0]), reverse=True)
+
+    async def zrevrange(self, name: str, start: int, end: int, withscores: bool = False):
+        ranked = self._ranked(name)[start:None if end == -1 else end + 1]
+        return ranked if withscores else [member for member, score in ranked]
+
+    async def zrevrank(self, name: str, member: str):
+        members = [item[0] for item in self._ranked(name)]
+        member = self._encode(member)
+        return members.index(member) if member in members else None
+
+    async def zscore(self, name: str, member: str):
+        return (self._get(name) or dict()).get(self._encode(member))
+
+    async def zunionstore(self, destination: str, keys: List[str], aggregate: str = None):
+        combine = {None: sum, 'SUM': sum, 'MIN': min, 'MAX': max}[aggregate]
+        scores = dict()
+        for key in keys:
+            for member, score in (self._get(key) or dict()).items():
+                scores.setdefault(member, []).append(score)
+
+        await self.delete(destination)
+        if scores:
+            self._data[destination] = {member: float(combine(values)) for member, values in scores.items()}
+        return len(scores)
+
+    async def scan_iter(self, match: str):
+        for key in list(self._data):
+            if self._get(key) is not None and fnmatchcase(key, match):
+                yield self._encode(key)
+
+    async def rename(self, source: str, destination: str):
+        self._data[destination] = self._data.pop(source)
+        self._expires_at.pop(destination, None)
+        if source in self._expires_at:
+            self._expires_at[destination] = self._expires_at.pop(source)
+        return True
+
+    async def _update_best_score(self, key: str, aggregate_key: str, member: str, score):
+        current = await self.zscore(key, member)
+        score = float(score)
+        if current is not None and current >= score:
+            return 0
+        await self.zadd(key, {member: score})
+        await self.zincrby(aggregate_key, score - (current or 0.0), member)
+        return 1
+
+    async def _hset_if_exists(self, name: str, key: str, value):
+        if self._get(name) is None:
+            return 0
+        await self.hset(name, key, value)
+        return 1
+
+    async def _pop_hash(self, name: str):
+        fields = await self.hgetall(name)
+        await self.delete(name)
+        return [item for field in fields.items() for item in field]
+
+    async def eval(self, script: str, numkeys: int, *keys_and_args):
+        scripts = {UPDATE_BEST_SCORE_SCRIPT: self._update_best_score, HSET_IF_EXISTS_SCRIPT: self._hset_if_exists,
+                   POP_HASH_SCRIPT: self._pop_hash}
+        return await scripts[script](*keys_and_args)
+
+    async def xadd(self, name: str, fields: Dict[str, bytes]):
+        stream = self._streams.setdefault(name, FakeStream())
+        entry_id = stream.next_id()
+        stream.entries[entry_id] = {self._encode(field): self._encode(value) for field, value in fields.items()}
+        stream.added.set()
+        return entry_id
+
+    async def xgroup_create(self, name: str, group: str, id: str = '0', mkstream: bool = True):
+        stream = self._streams.setdefault(name, FakeStream())
+        stream.groups.setdefault(group, {'delivered': set(), 'pending': dict()})
+        return True
+
+    def _read_group(self, stream: FakeStream, group: str, consumer: str, position: str, count: int):
+        state = stream.groups[group]
+
+        if position == '>':
+            entry_ids = [entry_id for entry_id in stream.entries if entry_id not in state['delivered']]
+        else:
+            entry_ids = [entry_id for entry_id, owner in state['pending'].items()
+                         if owner[0] == consumer and entry_id in stream.entries]
+
+        entry_ids = entry_ids[:count] if count else entry_ids
+        for entry_id in entry_ids:
+            state['delivered'].add(entry_id)
+            state['pending'][entry_id] = (consumer, monotonic())
+        return [(entry_id, stream.entries[entry_id]) for entry_id in entry_ids]
+
+    async def xreadgroup(self, group: str, consumer: str, streams: Dict[str, str], count: int = None,
+                         block: int = None):
+        while True:
+            response = []
+            for name, position in streams.items():
+                stream = self._streams[name]
+                stream.added.clear()
+                entries = self._read_group(stream, group, consumer, position, count)
+                if entries:
+                    response.append([name.encode(), entries])
+
+            if response or block is None or any(position != '>' for position in streams.values()):
+                return response
+
+            waiters = [asyncio.ensure_future(self._streams[name].added.wait()) for name in streams]
+            done, pending = await asyncio.wait(waiters, timeout=block / 1000 if block else None,
+                                               return_when=asyncio.FIRST_COMPLETED)
+            for waiter in pending:
+                waiter.cancel()
+            if not done:
+                return []
+
+    async def xack(self, name: str, group: str, *ids):
+        pending = self._streams[name].groups[group]['pending']
+        return sum(pending.pop(self._encode(entry_id), None) is not None for entry_id in ids)
+
+    async def xdel(self, name: str, *ids):
+        entries = self._streams[name].entries
+        return sum(entries.pop(self._encode(entry_id), None) is not None for entry_id in ids)
+
+    async def xlen(self, name: str):
+        stream = self._streams.get(name)
+        return len(stream.entries) if stream else 0
+
+    async def xpending(self, name: str, group: str):
+        pending = self._streams[name].groups[group]['pending']
+        return {'pending': len(pending)}
+
+    async def xpending_range(self, name: str, group: str, count: int):
+        pending = self._streams[name].groups[group]['pending']
+        return [
+            {'message_id': entry_id, 'consumer': consumer.encode(),
+             'time_since_delivered': int((monotonic() - delivered_at) * 1000)}
+            for entry_id, (consumer, delivered_at) in list(pending.items())[:count]
+        ]
+
+    async def xclaim(self, name: str, group: str, consumer: str, min_idle_time: int, ids: List):
+        stream = self._streams[name]
+        pending = stream.groups[group]['pending']
+        claimed = []
+
+        for entry_id in map(self._encode, ids):
+            owner = pending.get(entry_id)
+            if owner is None or (monotonic() - owner[1]) * 1000 < min_idle_time:
+                continue
+            pending[entry_id] = (consumer, monotonic())
+            if entry_id in stream.entries:
+                claimed.append((entry_id, stream.entries[entry_id]))
+        return claimed
+
+    async def mset(self, mapping: Dict[str, bytes], ex: int = None):
+        return [await self.set(key, value, ex=ex) for key, value in mapping.items()]
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+    async def close(self):
+        self._data.clear()
+        self._expires_at.clear()
+        self._streams.clear()
+
+
+class TieredCache:
+    def __init__(self, name: str, ttl: int, local_ttl: int, max_entries: int):
+        self.name = name
+        self.ttl = ttl
+        self.local = LRUCache(max_entries, local_ttl)
+        self.cache = None
+        self.local_generation = 0
+        self.remote_hits = 0
+        self.misses = 0
+
+    @property
+    def generation_key(self):
+        return f'catalog:::{self.name}:::generation'
+
+    def remote_key(self, generation: int):
+        return f'catalog:::{self.name}:::{generation}'
+
+    def bind(self, cache):
+        self.cache = cache
+
+    def clear_local(self):
+        self.local_generation += 1
+        self.local.clear()
+
+    async def get_or_load(self, key: str, load):
+        value = self.local.get(key)
+        if value is not None:
+            return value
+
+        local_generation = self.local_generation
+        remote_key = data = None
+
+        if self.cache is not None:
+            try:
+                remote_key = self.remote_key(int(await self.cache.get(self.generation_key) or 0))
+                data = await self.cache.hget(remote_key, key)
+            except RedisError as e:
+                logger.warning('Shared %s cache is unavailable, loading from the database: %s', self.name, e)
+                remote_key = None
+
+        if data is not None:
+            self.remote_hits += 1
+            value = orjson.loads(data)
+        else:
+            self.misses += 1
+            value = await load()
+
+            if remote_key is not None:
+                try:
+                    async with self.cache.pipeline() as pipe:
+                        pipe.hset(remote_key, key, orjson.dumps(value))
+                        pipe.expire(remote_key, self.ttl)
+                        await pipe.execute()
+                except RedisError as e:
+                    logger.warning('Unable to store %s in the shared cache: %s', self.name, e)
+
+        if local_generation == self.local_generation:
+            self.local.set(key, value)
+        return value
+
+    async def invalidate(self):
+        self.clear_local()
+
+        if self.cache is not None:
+            async with self.cache.pipeline() as pipe:
+                pipe.incr(self.generation_key)
+                pipe.publish(settings.CATALOG_INVALIDATION_CHANNEL, self.name)
+                await pipe.execute()
+
+    def stats(self):
+        local_stats = self.local.stats()
+        requests = local_stats['hits'] + self.remote_hits + self.misses
+
+        return {
+            'local_hits': local_stats['hits'],
+            'remote_hits': self.remote_hits,
+            'misses': self.misses,
+            'local_size': local_stats['size'],
+            'hit_ratio': (local_stats['hits'] + self.remote_hits) / requests if requests else 0.0
+        }
+
+
+tiered_caches: Dict[str, TieredCache] = dict()
+
+
+def cached(name: str, ttl: int = settings.CATALOG_CACHE_TTL, local_ttl: int = settings.CATALOG_LOCAL_CACHE_TTL,
+           max_entries: int = settings.CATALOG_LOCAL_CACHE_MAX_ENTRIES):
+    tiered_cache = tiered_caches[name] = TieredCache(name, ttl, local_ttl, max_entries)
+
+    def decorator(function):
+        @wraps(function)
+        async def wrapper(db, *args, **kwargs):
+            key = orjson.dumps([args, sorted(kwargs.items())]).decode()
+
+            async def load():
+                return [dict(item) for item in await function(db, *args, **kwargs)]
+
+            return await tiered_cache.get_or_load(key, load)
+
+        wrapper.cache = tiered_cache
+        return wrapper
+
+    return decorator
+
+
+def bind_tiered_caches(cache):
+    for tiered_cache in tiered_caches.values():
+        tiered_cache.bind(cache)
+
+
+async def listen_for_invalidations(cache):
+    while True:
+        try:
+            async for name in cache.listen(settings.CATALOG_INVALIDATION_CHANNEL):
+                tiered_cache = tiered_caches.get(name.decode())
+                if tiered_cache is not None:
+                    tiered_cache.clear_local()
+        except (ConnectionError, TimeoutError) as e:
+            logger.warning('Catalog invalidation listener disconnected: %s', e)
+
+        for tiered_cache in tiered_caches.values():
+            tiered_cache.clear_local()
+        await asyncio.sleep(1)
+
+
+def create_cache(url: str):
+    if settings.CACHE_BACKEND == 'memory':
+        return FakeCache()
+
+    client = from_url(
+        url,
+        max_connections=settings.REDIS_MAX_CONNECTIONS,
+        socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+        socket_connect_timeout=settings.REDIS_SOCKET_CONNECT_TIMEOUT,
+        health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL,
+        retry_on_timeout=True
+    )
+    listen_client = from_url(
+        url,
+        max_connections=1,
+        socket_timeout=None,
+        socket_connect_timeout=settings.REDIS_SOCKET_CONNECT_TIMEOUT,
+        socket_keepalive=True
+    )
+    return Cache(client, retries=settings.REDIS_RETRIES, listen_client=listen_client)
@@ -1,11 +1,11 @@
 from fastapi import Request
 from databases import Database
-from redis import Redis
+from .cache import Cache
 
 
 def get_db(request: Request) -> Database:
     return request.app.state.db
 
 
-def get_cache(request: Request) -> Redis:
+def get_cache(request: Request) -> Cache:
     return request.app.state.cache
@@ -1,10 +1,10 @@
 from fastapi import FastAPI
 from databases import Database
-from redis import Redis
+from .cache import Cache
 from starlette.routing import Mount
 
 
-def inject_dbs(app: FastAPI, db: Database, cache: Redis):
+def inject_dbs(app: FastAPI, db: Database, cache: Cache):
     app.state.db = db
     app.state.cache = cache
     for route in app.router.routes:
@@ -1,5 +1,7 @@
-from sqlalchemy import Column, Integer, String, DateTime, func, Boolean, Float, ForeignKey, Table, text
+from sqlalchemy import Column, Integer, String, DateTime, func, Boolean, Float, ForeignKey, Table, text, Index, \
+    UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB
 
 Base = declarative_base()
 
@@ -21,6 +23,10 @@ quiz_result = Table(
     Column('finished_at', DateTime, server_default=func.now()),
     Column('user_email', String(50), nullable=False),
     Column('quiz_id', Integer, ForeignKey('quizzes.id', ondelete='SET NULL')),
+    Column('submission_id', String(32), unique=True),
+    Index('ix_quiz_results_quiz_id_finished_at_id', 'quiz_id', 'finished_at', 'id'),
+    Index('ix_quiz_results_user_email_finished_at_id', 'user_email', 'finished_at', 'id'),
+    Index('ix_quiz_results_finished_at_id', 'finished_at', 'id')
 )
 
 question_category_associate = Table(
@@ -28,7 +34,9 @@ question_category_associate = Table(
     Base.metadata,
     Column('id', Integer, primary_key=True),
     Column('question_id', Integer, ForeignKey('questions.id', ondelete='CASCADE')),
-    Column('category_id', Integer, ForeignKey('categories.id', ondelete='CASCADE'))
+    Column('category_id', Integer, ForeignKey('categories.id', ondelete='CASCADE')),
+    UniqueConstraint('question_id', 'category_id', name='uq_questions_categories_question_id_category_id'),
+    Index('ix_questions_categories_category_id', 'category_id')
 )
 
 question = Table(
@@ -43,7 +51,9 @@ quiz_question_associate = Table(
     Base.metadata,
     Column('id', Integer, primary_key=True),
     Column('quiz_id', Integer, ForeignKey('quizzes.id', ondelete='CASCADE')),
-    Column('question_id', Integer, ForeignKey('questions.id', ondelete='CASCADE'))
+    Column('question_id', Integer, ForeignKey('questions.id', ondelete='CASCADE')),
+    UniqueConstraint('quiz_id', 'question_id', name='uq_quizzes_questions_quiz_id_question_id'),
+    Index('ix_quizzes_questions_question_id', 'question_id')
 )
 
 category = Table(
@@ -60,5 +70,59 @@ answer = Table(
     Column('id', Integer, primary_key=True),
     Column('answer_text', String(200), nullable=False, unique=True),
     Column('is_correct', Boolean, nullable=False),
-    Column('question_id', Integer, ForeignKey('questions.id', ondelete='CASCADE'))
+    Column('question_id', Integer, ForeignKey('questions.id', ondelete='CASCADE')),
+    Index('ix_answers_question_id', 'question_id')
+)
+
+quiz_result_answer = Table(
+    'quiz_result_answers',
+    Base.metadata,
+    Column('result_id', Integer, ForeignKey('quiz_results.id', ondelete='CASCADE'), primary_key=True),
+    Column('question_id', Integer, primary_key=True),
+    Column('user_answer_ids', ARRAY(Integer), nullable=False, server_default=text("'{}'")),
+    Column('correct_answer_ids', ARRAY(Integer), nullable=False, server_default=text("'{}'")),
+    Column('score', Float, nullable=False, server_default=text("0.0")),
+    Column('is_correct', Boolean, nullable=False, server_default=text("false"))
+)
+
+quiz_stats = Table(
+    'quiz_stats',
+    Base.metadata,
+    Column('quiz_id', Integer, ForeignKey('quizzes.id', ondelete='CASCADE'), primary_key=True),
+    Column('attempts', Integer, nullable=False, server_default=text("0")),
+    Column('score_sum', Float, nullable=False, server_default=text("0.0")),
+    Column('percent_sum', Float, nullable=False, server_default=text("0.0")),
+    Column('last_finished_at', DateTime)
+)
+
+quiz_score_histogram = Table(
+    'quiz_score_histogram',
+    Base.metadata,
+    Column('quiz_id', Integer, ForeignKey('quizzes.id', ondelete='CASCADE'), primary_key=True),
+    Column('bucket', Integer, primary_key=True),
+    Column('attempts', Integer, nullable=False, server_default=text("0"))
+)
+
+question_stats = Table(
+    'question_stats',
+    Base.metadata,
+    Column('quiz_id', Integer, ForeignKey('quizzes.id', ondelete='CASCADE'), primary_key=True),
+    Column('question_id', Integer, primary_key=True),
+    Column('attempts', Integer, nullable=False, server_default=text("0")),
+    Column('correct', Integer, nullable=False, server_default=text("0")),
+    Column('score_sum', Float, nullable=False, server_default=text("0.0")),
+    Index('ix_question_stats_question_id', 'question_id')
+)
+
+question_analysis = Table(
+    'question_analysis',
+    Base.metadata,
+    Column('quiz_id', Integer, ForeignKey('quizzes.id', ondelete='CASCADE'), primary_key=True),
+    Column('question_id', Integer, primary_key=True),
+    Column('responses', Integer, nullable=False),
+    Column('difficulty', Float, nullable=False),
+    Column('discrimination', Float),
+    Column('discrimination_index', Float),
+    Column('distractors', JSONB, nullable=False, server_default=text("'{}'")),
+    Column('analyzed_at', DateTime, nullable=False)
 )
@@ -0,0 +1,50 @@
+from databases import Database
+from time import perf_counter
+
+
+class MeasuredPool:
+    def __init__(self, pool):
+        self._pool = pool
+        self.acquired = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    async def acquire(self, *args, **kwargs):
+        started_at = perf_counter()
+        connection = await self._pool.acquire(*args, **kwargs)
+        wait_time = perf_counter() - started_at
+
+        self.acquired += 1
+        self.wait_time_total += wait_time
+        self.wait_time_max = max(self.wait_time_max, wait_time)
+
+        return connection
+
+    def __getattr__(self, name):
+        return getattr(self._pool, name)
+
+
+def instrument_pool(db: Database):
+    db._backend._pool = MeasuredPool(db._backend._pool)
+
+
+def get_pool_stats(db: Database):
+    pool = db._backend._pool
+    size = pool.get_size()
+    idle = pool.get_idle_size()
+    stats = {
+        'min_size': pool.get_min_size(),
+        'max_size': pool.get_max_size(),
+        'size': size,
+        'idle': idle,
+        'in_use': size - idle
+    }
+
+    if isinstance(pool, MeasuredPool):
+        stats.update({
+            'acquired': pool.acquired,
+            'wait_time_avg': pool.wait_time_total / pool.acquired if pool.acquired else 0.0,
+            'wait_time_max': pool.wait_time_max
+        })
+
+    return stats
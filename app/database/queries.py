@@ -1,23 +1,68 @@
 from fastapi import HTTPException, status
 from databases import Database
+from sqlalchemy import func, literal_column, tuple_, and_, case
 from sqlalchemy.sql import select
+from sqlalchemy.dialects.postgresql import aggregate_order_by, insert
 from asyncpg.exceptions import ForeignKeyViolationError, UniqueViolationError
-from typing import List
-from redis import Redis
-import json
-
-from .models import question, answer, category, question_category_associate, quiz, quiz_question_associate, quiz_result
+from typing import List, Tuple
+from datetime import datetime
+from time import time_ns
+from aioredis.exceptions import RedisError
+import logging
+import orjson
+
+from core.congif import settings
+from utils import form_quiz_questions_cache_key, form_result_details_cache_key, form_quiz_version_cache_key, \
+    form_answer_key_cache_key, form_quiz_leaderboard_key, form_global_leaderboard_key, parse_questions, SingleFlight
+from .cache import Cache, cached, UPDATE_BEST_SCORE_SCRIPT
+from .models import question, answer, category, question_category_associate, quiz, quiz_question_associate, \
+    quiz_result, quiz_result_answer, quiz_stats, quiz_score_histogram, question_stats, question_analysis
 from schemas.question import QuestionCreate, BaseQuestion, AnswerCreate, Answer, FullQuestion
 from schemas.category import CategoryCreate, Category
+from stats import aggregate_result_stats, score_percent, result_stats_buffer
 from schemas.quiz import QuizCreate, QuizForAdmin, QuizUpdate, QuizQuestionsAdd, QuizQuestionAssociate, \
     UserQuizResult, QuizQuestionAssociateCreate, QuizResultDetailsInCache
 
+logger = logging.getLogger(__name__)
+
+quiz_questions_loader = SingleFlight()
+
+MAX_QUERY_PARAMETERS = 32767
+
+
+def chunk_rows(rows: List[dict]):
+    size = max(1, MAX_QUERY_PARAMETERS // len(rows[0])) if rows else 1
+
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def select_questions_with_answers_and_categories():
+    answers_sq = select([
+        func.json_agg(aggregate_order_by(
+            func.json_build_object(literal_column("'id'"), answer.c.id,
+                                   literal_column("'answer_text'"), answer.c.answer_text,
+                                   literal_column("'is_correct'"), answer.c.is_correct),
+            answer.c.id
+        ))
+    ]).where(answer.c.question_id == question.c.id).scalar_subquery()
+
+    categories_sq = select([
+        func.json_agg(aggregate_order_by(
+            func.json_build_object(literal_column("'id'"), category.c.id,
+                                   literal_column("'name'"), category.c.name,
+                                   literal_column("'description'"), category.c.description),
+            category.c.id
+        ))
+    ]).select_from(category.join(question_category_associate)) \
+        .where(question_category_associate.c.question_id == question.c.id).scalar_subquery()
+
+    return select([question.c.id, question.c.question_text, answers_sq.label('answers'),
+                   categories_sq.label('categories')])
+
 
 async def get_questions(db: Database, question_id: int = None):
-    query = select([question, answer, category]).select_from(question) \
-        .join(question_category_associate, isouter=True) \
-        .join(category, isouter=True) \
-        .join(answer).order_by(question.c.id)
+    query = select_questions_with_answers_and_categories().order_by(question.c.id)
 
     if question_id:
         query = query.where(question.c.id == question_id)
@@ -34,27 +79,107 @@ async def get_questions_categories(db: Database):
 
 
 async def create_question(question_data: QuestionCreate, db: Database):
-    transaction = await db.transaction().start()
     answers_data = question_data.pop('answers')
 
-    query = question.insert().values(**question_data)
-
-    try:
-        new_question_id = await db.execute(query=query)
-    except UniqueViolationError as e:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
-                            detail=str(e))
-
-    for answer_data in answers_data:
-        new_answer = await add_question_answer(answer_data, new_question_id, db)
-        answer_data['id'] = new_answer.id
+    async with db.transaction():
+        try:
+            query = question.insert().values(**question_data).returning(question.c.id, question.c.question_text)
+            new_question = await db.fetch_one(query=query)
 
-    question_data['id'] = new_question_id
-    question_data['answers'] = answers_data
+            values_to_insert = [{**answer_data, 'question_id': new_question['id']} for answer_data in answers_data]
+            new_answers = []
 
-    await transaction.commit()
+            if values_to_insert:
+                query = answer.insert().values(values_to_insert) \
+                    .returning(answer.c.id, answer.c.answer_text, answer.c.is_correct)
+                new_answers = await db.fetch_all(query=query)
+        except UniqueViolationError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                detail=str(e))
 
-    return question_data
+    return {**new_question, 'answers': [dict(item) for item in new_answers]}
+
+
+IMPORT_STAGING_TABLES_SQL = '''
+    CREATE TEMP TABLE import_questions (line integer, question_text varchar(200)) ON COMMIT DROP;
+    CREATE TEMP TABLE import_answers (line integer, question_text varchar(200), answer_text varchar(200),
+                                      is_correct boolean) ON COMMIT DROP;
+    CREATE TEMP TABLE import_categories (line integer, question_text varchar(200),
+                                         category_name varchar(30)) ON COMMIT DROP;
+'''
+
+IMPORT_REJECT_CONFLICTS_SQL = '''
+    WITH existing_questions AS (
+        DELETE FROM import_questions iq
+        USING questions q
+        WHERE q.question_text = iq.question_text
+        RETURNING iq.line, iq.question_text
+    ), answer_conflicts AS (
+        DELETE FROM import_questions iq
+        USING import_answers ia, answers a
+        WHERE ia.question_text = iq.question_text AND a.answer_text = ia.answer_text
+          AND NOT EXISTS (SELECT 1 FROM questions q WHERE q.question_text = iq.question_text)
+        RETURNING iq.line, ia.answer_text
+    )
+    SELECT line, question_text, NULL AS answer_text FROM existing_questions
+    UNION ALL
+    SELECT line, NULL, min(answer_text) FROM answer_conflicts GROUP BY line
+    ORDER BY line
+'''
+
+IMPORT_CATEGORIES_SQL = '''
+    INSERT INTO categories (name, description)
+    SELECT DISTINCT ic.category_name, ''
+    FROM import_categories ic JOIN import_questions iq ON iq.question_text = ic.question_text
+    ON CONFLICT (name) DO NOTHING
+'''
+
+IMPORT_MERGE_SQL = '''
+    WITH new_questions AS (
+        INSERT INTO questions (question_text)
+        SELECT question_text FROM import_questions
+        ON CONFLICT (question_text) DO NOTHING
+        RETURNING id, question_text
+    ), new_answers AS (
+        INSERT INTO answers (answer_text, is_correct, question_id)
+        SELECT a.answer_text, a.is_correct, q.id
+        FROM import_answers a JOIN new_questions q ON q.question_text = a.question_text
+        ON CONFLICT (answer_text) DO NOTHING
+        RETURNING id
+    ), new_links AS (
+        INSERT INTO questions_categories (question_id, category_id)
+        SELECT q.id, c.id
+        FROM import_categories ic
+        JOIN new_questions q ON q.question_text = ic.question_text
+        JOIN categories c ON c.name = ic.category_name
+        ON CONFLICT (question_id, category_id) DO NOTHING
+        RETURNING id
+    )
+    SELECT (SELECT count(*) FROM new_questions) AS questions_created,
+           (SELECT count(*) FROM new_answers) AS answers_created,
+           (SELECT count(*) FROM new_links) AS categories_linked
+'''
+
+
+async def import_questions(questions_data: List[tuple], answers_data: List[tuple], categories_data: List[tuple],
+                           db: Database):
+    async with db.connection() as connection:
+        async with connection.transaction():
+            raw_connection = connection.raw_connection
+
+            await raw_connection.execute(IMPORT_STAGING_TABLES_SQL)
+            await raw_connection.copy_records_to_table('import_questions', records=questions_data,
+                                                       columns=['line', 'question_text'])
+            await raw_connection.copy_records_to_table('import_answers', records=answers_data,
+                                                       columns=['line', 'question_text', 'answer_text', 'is_correct'])
+            await raw_connection.copy_records_to_table('import_categories', records=categories_data,
+                                                       columns=['line', 'question_text', 'category_name'])
+            rejected = await raw_connection.fetch(IMPORT_REJECT_CONFLICTS_SQL)
+            await raw_connection.execute(IMPORT_CATEGORIES_SQL)
+            query_result = await raw_connection.fetchrow(IMPORT_MERGE_SQL)
+
+    await get_categories.cache.invalidate()
+    return query_result, rejected
 
 
 async def update_question(id: int, question_data: BaseQuestion, db: Database):
@@ -75,21 +200,13 @@ async def delete_question(id: int, db: Database):
     return await db.fetch_one(query=query)
 
 
-async def add_question_answer(answer_data: AnswerCreate, question_id: int, db: Database,
-                              transaction: Database.transaction = None):
+async def add_question_answer(answer_data: AnswerCreate, question_id: int, db: Database):
     query = answer.insert().values(**answer_data, question_id=question_id) \
         .returning(answer.c.id, answer.c.answer_text, answer.c.is_correct, answer.c.question_id)
 
     try:
         query_result = await db.fetch_one(query=query)
-    except ForeignKeyViolationError as e:
-        if transaction:
-            await transaction.rollback()
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
-                            detail=str(e))
-    except UniqueViolationError as e:
-        if transaction:
-            await transaction.rollback()
+    except (ForeignKeyViolationError, UniqueViolationError) as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
                             detail=str(e))
     return Answer(**query_result)
@@ -119,6 +236,7 @@ async def delete_question_answer(answer_id: int, question_id: int, db: Database)
     return await db.fetch_one(query=query)
 
 
+@cached('categories')
 async def get_categories(db: Database):
     query = category.select()
     return await db.fetch_all(query=query)
@@ -133,6 +251,7 @@ async def create_category(category_data: CategoryCreate, db: Database):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
                             detail=str(e))
 
+    await get_categories.cache.invalidate()
     return query_result
 
 
@@ -146,36 +265,34 @@ async def update_category(category_id: int, category_data: CategoryCreate, db: D
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
                             detail=str(e))
 
+    await get_categories.cache.invalidate()
     return query_result
 
 
 async def delete_category(category_id: int, db: Database):
     query = category.delete().returning(category.c.id).where(category.c.id == category_id)
-    return await db.fetch_one(query=query)
+    query_result = await db.fetch_one(query=query)
 
+    await get_categories.cache.invalidate()
+    return query_result
 
-async def add_question_category(category_id: int, question_id: int, db: Database):
-    query = select([question_category_associate]) \
-        .where(question_category_associate.c.category_id == category_id,
-               question_category_associate.c.question_id == question_id)
-
-    already_added = await db.fetch_all(query=query)
 
-    if not already_added:
-        query = question_category_associate.insert().values(category_id=category_id, question_id=question_id) \
-            .returning(question_category_associate.c.id, question_category_associate.c.category_id,
-                       question_category_associate.c.question_id)
+async def add_question_category(category_id: int, question_id: int, db: Database):
+    query = question_category_associate.insert().values(category_id=category_id, question_id=question_id) \
+        .returning(question_category_associate.c.id, question_category_associate.c.category_id,
+                   question_category_associate.c.question_id)
 
-        try:
-            query_result = await db.fetch_one(query=query)
-        except ForeignKeyViolationError as e:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
-                                detail=str(e))
-        return query_result
-    else:
+    try:
+        query_result = await db.fetch_one(query=query)
+    except ForeignKeyViolationError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=str(e))
+    except UniqueViolationError:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
                             detail=f"Question already has this category")
 
+    return query_result
+
 
 async def delete_question_category(category_id: int, question_id: int, db: Database):
     query = question_category_associate.delete().returning(question_category_associate.c.id) \
@@ -184,7 +301,9 @@ async def delete_question_category(category_id: int, question_id: int, db: Datab
     return await db.fetch_one(query=query)
 
 
-async def get_quizzes(db: Database, quiz_id: int = None, active: bool = False):
+@cached('quizzes')
+async def get_quizzes(db: Database, quiz_id: int = None, active: bool = False, version: int = None):
+    # version is not part of the query, it only keys the cached entry to the quiz version it was loaded for
     query = select([quiz])
 
     if quiz_id:
@@ -196,47 +315,59 @@ async def get_quizzes(db: Database, quiz_id: int = None, active: bool = False):
 
 
 async def get_quiz_questions(quiz_id: int, db: Database):
-    sq = (select([quiz_question_associate]).where(quiz_question_associate.c.quiz_id == quiz_id)).alias('sq')
-
-    query = select([question, answer, category]).select_from(question) \
-        .join(sq) \
-        .join(question_category_associate, isouter=True) \
-        .join(category, isouter=True) \
-        .join(answer).order_by(question.c.id)
+    query = select_questions_with_answers_and_categories() \
+        .select_from(question.join(quiz_question_associate)) \
+        .where(quiz_question_associate.c.quiz_id == quiz_id) \
+        .order_by(question.c.id)
 
     return await db.fetch_all(query=query)
 
 
-async def get_quiz_questions_with_correct_answers(quiz_id: int, db: Database):
-    sq_1 = (select([quiz_question_associate]).where(quiz_question_associate.c.quiz_id == quiz_id)).alias('sq_1')
-    sq_2 = (select([answer]).where(answer.c.is_correct)).alias('sq_2')
+async def get_quiz_ids_by_question(question_id: int, db: Database):
+    query = select([quiz_question_associate.c.quiz_id]).where(quiz_question_associate.c.question_id == question_id)
+    query_result = await db.fetch_all(query=query)
+
+    return [item['quiz_id'] for item in query_result]
+
+
+async def get_quiz_ids_by_category(category_id: int, db: Database):
+    join_1 = quiz_question_associate.join(
+        question_category_associate,
+        quiz_question_associate.c.question_id == question_category_associate.c.question_id
+    )
+    query = select([quiz_question_associate.c.quiz_id]).distinct().select_from(join_1) \
+        .where(question_category_associate.c.category_id == category_id)
+    query_result = await db.fetch_all(query=query)
+
+    return [item['quiz_id'] for item in query_result]
 
-    query = select([question.c.id, sq_2.c.id]).select_from(question) \
-        .join(sq_1) \
-        .join(sq_2) \
-        .order_by(question.c.id)
+
+async def get_quiz_questions_with_correct_answers(quiz_id: int, db: Database):
+    join_1 = quiz_question_associate.outerjoin(
+        answer,
+        and_(answer.c.question_id == quiz_question_associate.c.question_id, answer.c.is_correct)
+    )
+    query = select([quiz_question_associate.c.question_id, answer.c.id]).select_from(join_1) \
+        .where(quiz_question_associate.c.quiz_id == quiz_id)
 
     return await db.fetch_all(query=query)
 
 
 async def create_quiz(quiz_data: QuestionCreate, db: Database):
-    transaction = await db.transaction().start()
-
     questions = quiz_data.pop('questions')
-    query = quiz.insert().values(**quiz_data).returning(quiz)
 
-    try:
-        new_quiz = await db.fetch_one(query=query)
-    except UniqueViolationError as e:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
-                            detail=str(e))
+    async with db.transaction():
+        query = quiz.insert().values(**quiz_data).returning(quiz)
 
-    new_quiz_id = QuizForAdmin(**new_quiz).id
-
-    await add_quiz_questions(new_quiz_id, questions, db, transaction)
+        try:
+            new_quiz = await db.fetch_one(query=query)
+        except UniqueViolationError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                detail=str(e))
 
-    await transaction.commit()
+        await add_quiz_questions(new_quiz['id'], questions, db)
 
+    await get_quizzes.cache.invalidate()
     return new_quiz
 
 
@@ -247,38 +378,41 @@ async def update_quiz(quiz_id: int, quiz_data: QuizUpdate, db: Database):
     except UniqueViolationError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
                             detail=str(e))
+
+    await get_quizzes.cache.invalidate()
     return query_result
 
 
 async def delete_quiz(quiz_id: int, db: Database):
     query = quiz.delete().returning(quiz.c.id).where(quiz.c.id == quiz_id)
-    return await db.fetch_one(query=query)
+    query_result = await db.fetch_one(query=query)
 
+    await get_quizzes.cache.invalidate()
+    return query_result
 
-async def add_quiz_questions(quiz_id: int, questions_to_add: List[int], db: Database,
-                             transaction: Database.transaction = None):
-    query = select([quiz_question_associate]).where(quiz_question_associate.c.quiz_id == quiz_id)
-    query_result = await db.fetch_all(query)
-    already_added = [QuizQuestionAssociate(**item).question_id for item in query_result]
-    intersection = set(questions_to_add).intersection(already_added)
 
-    if len(intersection) > 0:
-        if transaction:
-            await transaction.rollback()
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
-                            detail=f"Questions with ids: {intersection} have already been added to the quiz")
+async def add_quiz_questions(quiz_id: int, questions_to_add: List[int], db: Database):
+    if not questions_to_add:
+        return []
 
     values_to_insert = [QuizQuestionAssociateCreate(quiz_id=quiz_id, question_id=question_id).dict()for question_id in
                         questions_to_add]
-    query = quiz_question_associate.insert().values(values_to_insert).returning(quiz_question_associate)
+    query = insert(quiz_question_associate).values(values_to_insert) \
+        .on_conflict_do_nothing(index_elements=['quiz_id', 'question_id']) \
+        .returning(quiz_question_associate)
 
-    try:
-        query_result = await db.fetch_all(query=query)
-    except ForeignKeyViolationError as e:
-        if transaction:
-            await transaction.rollback()
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
-                            detail=str(e))
+    async with db.transaction():
+        try:
+            query_result = await db.fetch_all(query=query)
+        except ForeignKeyViolationError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                detail=str(e))
+
+        intersection = set(questions_to_add).difference(item['question_id'] for item in query_result)
+
+        if intersection:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                detail=f"Questions with ids: {intersection} have already been added to the quiz")
 
     return query_result
 
@@ -291,22 +425,154 @@ async def delete_quiz_question(quiz_id: int, question_id: int, db: Database):
 
 
 async def save_result_to_db(result_data: UserQuizResult, db: Database):
-    result_data.pop('answers')
-    query = quiz_result.insert().values(**result_data).returning(quiz_result)
-    return await db.fetch_one(query=query)
+    answers_data = result_data.pop('answers')
+
+    async with db.transaction():
+        query = quiz_result.insert().values(**result_data).returning(quiz_result)
+        new_result = await db.fetch_one(query=query)
+
+        values_to_insert = [{**answer_data, 'result_id': new_result['id']} for answer_data in answers_data]
+        for chunk in chunk_rows(values_to_insert):
+            await db.execute(query=quiz_result_answer.insert().values(chunk))
+
+    result_stats_buffer.add([{**result_data, 'answers': answers_data}])
+    return new_result
+
+
+async def save_results_batch(results_data: List[dict], db: Database):
+    answers_by_submission = {result_data['submission_id']: result_data.pop('answers') for result_data in results_data}
+
+    async with db.transaction():
+        new_results = []
+
+        for chunk in chunk_rows(results_data):
+            query = insert(quiz_result).values(chunk) \
+                .on_conflict_do_nothing(index_elements=[quiz_result.c.submission_id]) \
+                .returning(quiz_result.c.id, quiz_result.c.submission_id)
+            new_results.extend(await db.fetch_all(query=query))
+
+        values_to_insert = [{**answer_data, 'result_id': new_result['id']}
+                            for new_result in new_results
+                            for answer_data in answers_by_submission[new_result['submission_id']]]
+        for chunk in chunk_rows(values_to_insert):
+            await db.execute(query=quiz_result_answer.insert().values(chunk))
+
+        new_submission_ids = {new_result['submission_id'] for new_result in new_results}
+        await update_result_stats([{**result_data, 'answers': answers_by_submission[result_data['submission_id']]}
+                                   for result_data in results_data
+                                   if result_data['submission_id'] in new_submission_ids], db)
+
+    return new_results
+
+
+async def update_result_stats(results_data: List[dict], db: Database):
+    await apply_result_stats(*aggregate_result_stats(results_data), db)
+
+
+async def apply_result_stats(quizzes_rows: List[dict], histogram_rows: List[dict], questions_rows: List[dict],
+                             db: Database):
+    for chunk in chunk_rows(quizzes_rows):
+        query = insert(quiz_stats).values(chunk)
+        query = query.on_conflict_do_update(index_elements=[quiz_stats.c.quiz_id], set_={
+            'attempts': quiz_stats.c.attempts + query.excluded.attempts,
+            'score_sum': quiz_stats.c.score_sum + query.excluded.score_sum,
+            'percent_sum': quiz_stats.c.percent_sum + query.excluded.percent_sum,
+            'last_finished_at': func.greatest(quiz_stats.c.last_finished_at, query.excluded.last_finished_at)
+        })
+        await db.execute(query=query)
+
+    for chunk in chunk_rows(histogram_rows):
+        query = insert(quiz_score_histogram).values(chunk)
+        query = query.on_conflict_do_update(
+            index_elements=[quiz_score_histogram.c.quiz_id, quiz_score_histogram.c.bucket],
+            set_={'attempts': quiz_score_histogram.c.attempts + query.excluded.attempts}
+        )
+        await db.execute(query=query)
+
+    for chunk in chunk_rows(questions_rows):
+        query = insert(question_stats).values(chunk)
+        query = query.on_conflict_do_update(index_elements=[question_stats.c.quiz_id, question_stats.c.question_id],
+                                            set_={
+                                                'attempts': question_stats.c.attempts + query.excluded.attempts,
+                                                'correct': question_stats.c.correct + query.excluded.correct,
+                                                'score_sum': question_stats.c.score_sum + query.excluded.score_sum
+                                            })
+        await db.execute(query=query)
+
+
+async def get_quiz_stats(quiz_id: int, db: Database):
+    stats_row = await db.fetch_one(query=select([quiz_stats]).where(quiz_stats.c.quiz_id == quiz_id))
+    histogram = await db.fetch_all(query=select([quiz_score_histogram])
+                                   .where(quiz_score_histogram.c.quiz_id == quiz_id)
+                                   .order_by(quiz_score_histogram.c.bucket))
+    questions_stats = await db.fetch_all(query=select([question_stats])
+                                         .where(question_stats.c.quiz_id == quiz_id)
+                                         .order_by(question_stats.c.question_id))
+
+    return stats_row, histogram, questions_stats
+
+
+async def get_quizzes_stats(db: Database):
+    stats_rows = await db.fetch_all(query=select([quiz_stats]).order_by(quiz_stats.c.quiz_id))
+    histogram = await db.fetch_all(query=select([quiz_score_histogram])
+                                   .order_by(quiz_score_histogram.c.quiz_id, quiz_score_histogram.c.bucket))
+
+    return stats_rows, histogram
+
+
+async def get_category_stats(category_id: int, db: Database):
+    query = select([
+        question_stats.c.question_id,
+        func.sum(question_stats.c.attempts).label('attempts'),
+        func.sum(question_stats.c.correct).label('correct'),
+        func.sum(question_stats.c.score_sum).label('score_sum')
+    ]).select_from(question_stats.join(question_category_associate,
+                                       question_stats.c.question_id == question_category_associate.c.question_id)) \
+        .where(question_category_associate.c.category_id == category_id) \
+        .group_by(question_stats.c.question_id) \
+        .order_by(question_stats.c.question_id)
 
+    return await db.fetch_all(query=query)
 
-async def get_quizzes_results(quiz_id, user, db: Database):
-    query = select([quiz_result])
 
+def filter_quizzes_results(query, quiz_id: int = None, user: str = None, finished_from: datetime = None,
+                           finished_to: datetime = None, min_score: float = None, max_score: float = None):
     if quiz_id:
         query = query.where(quiz_result.c.quiz_id == quiz_id)
     if user:
         query = query.where(quiz_result.c.user_email == user)
+    if finished_from:
+        query = query.where(quiz_result.c.finished_at >= finished_from)
+    if finished_to:
+        query = query.where(quiz_result.c.finished_at < finished_to)
+    if min_score is not None:
+        query = query.where(quiz_result.c.user_score >= min_score)
+    if max_score is not None:
+        query = query.where(quiz_result.c.user_score <= max_score)
+
+    return query
+
+
+async def get_quizzes_results(quiz_id, user, db: Database, limit: int, cursor: Tuple[datetime, int] = None,
+                              **filters):
+    query = filter_quizzes_results(select([quiz_result]), quiz_id, user, **filters)
+
+    if cursor:
+        query = query.where(tuple_(quiz_result.c.finished_at, quiz_result.c.id) < tuple_(*cursor))
+
+    query = query.order_by(quiz_result.c.finished_at.desc(), quiz_result.c.id.desc()).limit(limit)
 
     return await db.fetch_all(query=query)
 
 
+async def iterate_quizzes_results(db: Database, **filters):
+    query = filter_quizzes_results(select([quiz_result]), **filters) \
+        .order_by(quiz_result.c.finished_at, quiz_result.c.id)
+
+    async for row in db.iterate(query=query):
+        yield row
+
+
 async def get_quiz_result(result_id: int, user: str, db: Database):
     query = select([quiz_result]).where(quiz_result.c.id == result_id)
     if user:
@@ -315,22 +581,204 @@ async def get_quiz_result(result_id: int, user: str, db: Database):
     return await db.fetch_all(query=query)
 
 
-async def get_quiz_result_detail_from_cache(result_id, db: Redis):
-    query = select([quiz_result]).where(quiz_result.c.id == result_id)
+async def get_quiz_result_with_answers(result_id: int, db: Database):
+    query = select([quiz_result, quiz_result_answer.c.question_id, quiz_result_answer.c.user_answer_ids,
+                    quiz_result_answer.c.correct_answer_ids, quiz_result_answer.c.score,
+                    quiz_result_answer.c.is_correct]) \
+        .select_from(quiz_result.outerjoin(quiz_result_answer)) \
+        .where(quiz_result.c.id == result_id) \
+        .order_by(quiz_result_answer.c.question_id)
+
     return await db.fetch_all(query=query)
 
 
-async def save_result_detail_to_cache(cache_key, data, cache: Redis):
-    data.finished_at = str(data.finished_at)
+def queue_result_detail_writes(pipe, result_id: int, data: str, result_data: dict = None):
+    pipe.set(form_result_details_cache_key(result_id), data, ex=settings.RESULT_DETAILS_CACHE_TTL)
 
-    await cache.set(cache_key, json.dumps(QuizResultDetailsInCache(**data.dict()).dict()))
-    await cache.expire(cache_key, 172800)
+    if result_data and result_data['quiz_id'] is not None:
+        pipe.eval(UPDATE_BEST_SCORE_SCRIPT, 2, form_quiz_leaderboard_key(result_data['quiz_id']),
+                  form_global_leaderboard_key(), result_data['user_email'],
+                  score_percent(result_data['user_score'], result_data['max_score']))
 
 
-async def get_result_detail_from_cache(key, cache: Redis):
-    data = await cache.get(key)
+async def save_result_detail_to_cache(result_id: int, data: str, cache: Cache, result_data: dict = None):
+    try:
+        async with cache.pipeline() as pipe:
+            queue_result_detail_writes(pipe, result_id, data, result_data)
+            await pipe.execute()
+    except RedisError as e:
+        logger.warning('Unable to cache details of quiz result %s: %s', result_id, e)
 
-    if not data:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
-                            detail='Data for this quiz result does not exist or has been deleted')
-    return data
+
+async def get_result_detail_from_cache(result_id: int, cache: Cache):
+    return await cache.get(form_result_details_cache_key(result_id))
+
+
+async def get_quiz_questions_from_cache(quiz_id: int, view: str, version: int, cache: Cache):
+    return await cache.get(form_quiz_questions_cache_key(quiz_id, view, version))
+
+
+async def save_quiz_questions_to_cache(quiz_id: int, view: str, version: int, data: str, cache: Cache):
+    await cache.set(form_quiz_questions_cache_key(quiz_id, view, version), data,
+                    ex=settings.QUIZ_QUESTIONS_CACHE_TTL)
+
+
+async def load_quiz_questions(quiz_id: int, view: str, version: int, model, db: Database, cache: Cache):
+    quiz_questions = await get_quiz_questions_from_cache(quiz_id, view, version, cache)
+
+    if quiz_questions:
+        return quiz_questions
+
+    async def load():
+        instances = await get_quiz_questions(quiz_id, db)
+        data = orjson.dumps([model(**item).dict() for item in parse_questions(instances)])
+        await save_quiz_questions_to_cache(quiz_id, view, version, data, cache)
+        return data
+
+    return await quiz_questions_loader.do((quiz_id, view, version), load)
+
+
+async def get_quiz_version(quiz_id: int, cache: Cache):
+    key = form_quiz_version_cache_key(quiz_id)
+    version = await cache.get(key)
+
+    if version is None:
+        await cache.set(key, time_ns(), ex=settings.QUIZ_VERSION_CACHE_TTL, nx=True)
+        version = await cache.get(key)
+
+    return int(version)
+
+
+async def get_answer_key_from_cache(quiz_id: int, version: int, cache: Cache):
+    return await cache.get(form_answer_key_cache_key(quiz_id, version))
+
+
+async def save_answer_key_to_cache(quiz_id: int, version: int, data: bytes, cache: Cache):
+    await cache.set(form_answer_key_cache_key(quiz_id, version), data, ex=settings.ANSWER_KEY_CACHE_TTL)
+
+
+async def invalidate_quiz_caches(quiz_ids: List[int], cache: Cache):
+    if not quiz_ids:
+        return
+
+    async with cache.pipeline() as pipe:
+        for quiz_id in quiz_ids:
+            pipe.set(form_quiz_version_cache_key(quiz_id), time_ns(), ex=settings.QUIZ_VERSION_CACHE_TTL, nx=True)
+            pipe.incr(form_quiz_version_cache_key(quiz_id))
+        await pipe.execute()
+
+
+ANALYSIS_RESPONSES_SQL = """
+SELECT coalesce(array_agg(a.result_id), '{}') AS result_ids,
+       coalesce(array_agg(a.question_id), '{}') AS question_ids,
+       coalesce(array_agg(a.score), '{}') AS scores,
+       coalesce(array_agg(a.is_correct), '{}') AS is_correct
+FROM quiz_result_answers a
+JOIN quiz_results r ON r.id = a.result_id
+WHERE r.quiz_id = $1
+"""
+
+ANALYSIS_PICKS_SQL = """
+SELECT coalesce(array_agg(a.question_id), '{}') AS question_ids,
+       coalesce(array_agg(picked.answer_id), '{}') AS answer_ids
+FROM quiz_result_answers a
+JOIN quiz_results r ON r.id = a.result_id
+CROSS JOIN LATERAL unnest(a.user_answer_ids) AS picked(answer_id)
+WHERE r.quiz_id = $1
+"""
+
+ANALYSIS_KEYS_SQL = """
+SELECT coalesce(array_agg(question_id), '{}') AS question_ids,
+       coalesce(array_agg(answer_id), '{}') AS answer_ids
+FROM (
+    SELECT DISTINCT a.question_id, correct.answer_id
+    FROM quiz_result_answers a
+    JOIN quiz_results r ON r.id = a.result_id
+    CROSS JOIN LATERAL unnest(a.correct_answer_ids) AS correct(answer_id)
+    WHERE r.quiz_id = $1
+) AS keys
+"""
+
+
+async def get_quiz_analysis_data(quiz_id: int, db: Database):
+    async with db.connection() as connection:
+        async with connection.transaction(isolation='repeatable_read', readonly=True):
+            raw_connection = connection.raw_connection
+            responses = await raw_connection.fetchrow(ANALYSIS_RESPONSES_SQL, quiz_id)
+            picks = await raw_connection.fetchrow(ANALYSIS_PICKS_SQL, quiz_id)
+            keys = await raw_connection.fetchrow(ANALYSIS_KEYS_SQL, quiz_id)
+
+    return responses, picks, keys
+
+
+async def save_question_analysis(quiz_id: int, analysis_data: List[dict], db: Database):
+    async with db.transaction():
+        await db.execute(query=question_analysis.delete().where(question_analysis.c.quiz_id == quiz_id))
+
+        for chunk in chunk_rows(analysis_data):
+            await db.execute(query=question_analysis.insert().values(chunk))
+
+
+async def get_question_analysis(quiz_id: int, db: Database):
+    query = select([question_analysis]).where(question_analysis.c.quiz_id == quiz_id) \
+        .order_by(question_analysis.c.question_id)
+
+    return await db.fetch_all(query=query)
+
+
+async def get_leaderboard(key: str, limit: int, user_email: str, cache: Cache):
+    async with cache.pipeline() as pipe:
+        pipe.zrevrange(key, 0, limit - 1, withscores=True)
+        pipe.zrevrank(key, user_email)
+        pipe.zscore(key, user_email)
+        top, rank, score = await pipe.execute()
+
+    return {
+        'entries': [{'rank': position + 1, 'user_email': member.decode(), 'score': member_score}
+                    for position, (member, member_score) in enumerate(top)],
+        'me': {'rank': rank + 1, 'user_email': user_email, 'score': score} if rank is not None else None
+    }
+
+
+async def iterate_best_scores(db: Database):
+    percent = case((quiz_result.c.max_score > 0,
+                    func.least(func.greatest(quiz_result.c.user_score / quiz_result.c.max_score * 100, 0), 100)),
+                   else_=0)
+    query = select([quiz_result.c.quiz_id, quiz_result.c.user_email, func.max(percent).label('best_percent')]) \
+        .where(quiz_result.c.quiz_id.isnot(None)) \
+        .group_by(quiz_result.c.quiz_id, quiz_result.c.user_email)
+
+    async for row in db.iterate(query=query):
+        yield row
+
+
+async def replace_leaderboard(key: str, scores: dict, cache: Cache):
+    if not scores:
+        return
+
+    staging_key = f'{key}:::rebuild'
+    items = list(scores.items())
+    await cache.delete(staging_key)
+
+    for start in range(0, len(items), settings.LEADERBOARD_REBUILD_CHUNK_SIZE):
+        await cache.zadd(staging_key, dict(items[start:start + settings.LEADERBOARD_REBUILD_CHUNK_SIZE]))
+
+    # merged instead of renamed over the live board, so best scores saved while the rebuild ran are kept
+    await cache.zunionstore(key, [staging_key, key], aggregate='MAX')
+    await cache.delete(staging_key)
+
+
+async def delete_stale_quiz_leaderboards(quiz_ids: set, cache: Cache):
+    prefix = form_quiz_leaderboard_key('')
+    stale_keys = []
+
+    async for key in cache.scan_iter(f'{prefix}*'):
+        key = key.decode()
+        quiz_id = key[len(prefix):]
+        if quiz_id.isdigit() and int(quiz_id) not in quiz_ids:
+            stale_keys.append(key)
+
+    for start in range(0, len(stale_keys), settings.LEADERBOARD_REBUILD_CHUNK_SIZE):
+        await cache.delete(*stale_keys[start:start + settings.LEADERBOARD_REBUILD_CHUNK_SIZE])
+
+    return len(stale_keys)
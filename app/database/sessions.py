@@ -0,0 +1,106 @@
+from typing import Dict, List, Optional
+
+from database.cache import Cache, HSET_IF_EXISTS_SCRIPT, POP_HASH_SCRIPT
+from utils import form_quiz_session_cache_key, form_quiz_session_questions_cache_key
+
+ANSWER_FIELD_PREFIX = 'a:'
+
+
+def encode_ids(ids) -> bytes:
+    return ','.join(str(item) for item in ids).encode()
+
+
+def decode_ids(data: Optional[bytes]) -> List[int]:
+    if not data:
+        return []
+    return [int(item) for item in data.split(b',')]
+
+
+def decode_session(fields: Dict[bytes, bytes]):
+    answers = dict()
+    prefix = ANSWER_FIELD_PREFIX.encode()
+
+    for field, value in fields.items():
+        if field.startswith(prefix):
+            answers[int(field[len(prefix):])] = decode_ids(value)
+
+    return {
+        'quiz_id': int(fields[b'quiz_id']),
+        'user': fields[b'user'].decode(),
+        'version': int(fields[b'version']),
+        'deadline': float(fields[b'deadline']),
+        'order': decode_ids(fields[b'order']),
+        'key': fields[b'key'],
+        'answers': answers
+    }
+
+
+async def refresh_session_questions(quiz_id: int, version: int, ttl: int, cache: Cache):
+    return await cache.expire(form_quiz_session_questions_cache_key(quiz_id, version), ttl)
+
+
+async def save_session_questions(quiz_id: int, version: int, questions: Dict[str, bytes], ttl: int, cache: Cache):
+    key = form_quiz_session_questions_cache_key(quiz_id, version)
+
+    async with cache.pipeline() as pipe:
+        pipe.hset(key, mapping=questions)
+        pipe.expire(key, ttl)
+        await pipe.execute()
+
+
+async def get_session_question(quiz_id: int, version: int, question_id: int, cache: Cache):
+    return await cache.hget(form_quiz_session_questions_cache_key(quiz_id, version), str(question_id))
+
+
+async def create_session(session_id: str, quiz_id: int, user: str, version: int, order: List[int], key: bytes,
+                         deadline: float, ttl: int, cache: Cache):
+    session_key = form_quiz_session_cache_key(session_id)
+
+    async with cache.pipeline() as pipe:
+        pipe.hset(session_key, mapping={
+            'quiz_id': quiz_id,
+            'user': user,
+            'version': version,
+            'deadline': int(deadline),
+            'order': encode_ids(order),
+            'key': key
+        })
+        pipe.expire(session_key, ttl)
+        await pipe.execute()
+
+
+async def get_session_header(session_id: str, cache: Cache):
+    fields = ['quiz_id', 'user', 'version', 'deadline', 'order']
+    values = await cache.hmget(form_quiz_session_cache_key(session_id), fields)
+
+    if values[0] is None:
+        return None
+
+    quiz_id, user, version, deadline, order = values
+    return {
+        'quiz_id': int(quiz_id),
+        'user': user.decode(),
+        'version': int(version),
+        'deadline': float(deadline),
+        'order': decode_ids(order)
+    }
+
+
+async def get_session(session_id: str, cache: Cache):
+    fields = await cache.hgetall(form_quiz_session_cache_key(session_id))
+    return decode_session(fields) if fields else None
+
+
+async def save_session_answer(session_id: str, question_id: int, answer_ids: List[int], cache: Cache):
+    return bool(await cache.eval(HSET_IF_EXISTS_SCRIPT, 1, form_quiz_session_cache_key(session_id),
+                                 f'{ANSWER_FIELD_PREFIX}{question_id}', encode_ids(sorted(set(answer_ids)))))
+
+
+async def get_session_answer(session_id: str, question_id: int, cache: Cache):
+    return decode_ids(await cache.hget(form_quiz_session_cache_key(session_id), f'{ANSWER_FIELD_PREFIX}{question_id}'))
+
+
+async def pop_session(session_id: str, cache: Cache):
+    # read and delete in one script so concurrent finishes can't both get the session
+    fields = await cache.eval(POP_HASH_SCRIPT, 1, form_quiz_session_cache_key(session_id))
+    return decode_session(dict(zip(fields[::2], fields[1::2]))) if fields else None
@@ -0,0 +1,197 @@
+from aioredis.exceptions import ResponseError, RedisError
+from asyncpg.exceptions import PostgresConnectionError, CannotConnectNowError, TooManyConnectionsError, \
+    ConnectionDoesNotExistError
+from databases import Database
+from datetime import datetime
+from socket import gethostname
+from time import monotonic
+from uuid import uuid4
+import asyncio
+import logging
+import os
+import orjson
+
+from core.congif import settings
+from database import queries
+from database.cache import Cache
+from stats import result_stats_buffer
+
+logger = logging.getLogger(__name__)
+
+consumer_name = f'{gethostname()}-{os.getpid()}'
+
+TRANSIENT_ERRORS = (OSError, asyncio.TimeoutError, RedisError, PostgresConnectionError, CannotConnectNowError,
+                    TooManyConnectionsError, ConnectionDoesNotExistError)
+
+
+async def submit_result(result_data: dict, db: Database, cache: Cache):
+    result_details = orjson.dumps(result_data)
+
+    if not settings.RESULTS_WRITE_BEHIND:
+        result = await queries.save_result_to_db(result_data, db)
+        await queries.save_result_detail_to_cache(result['id'], result_details, cache, result_data)
+        return result
+
+    submission_id = uuid4().hex
+    await cache.xadd(settings.RESULTS_STREAM, {'submission_id': submission_id, 'result': result_details})
+    result_data.pop('answers')
+
+    return {**result_data, 'submission_id': submission_id}
+
+
+async def ensure_results_group(cache: Cache):
+    try:
+        await cache.xgroup_create(settings.RESULTS_STREAM, settings.RESULTS_STREAM_GROUP)
+    except ResponseError as e:
+        if 'BUSYGROUP' not in str(e):
+            raise
+
+
+async def write_results(entries, db: Database, cache: Cache):
+    results_data = []
+    details = dict()
+
+    for entry_id, fields in entries:
+        submission_id = fields[b'submission_id'].decode()
+        result_data = orjson.loads(fields[b'result'])
+        result_data['submission_id'] = submission_id
+        result_data['finished_at'] = datetime.fromisoformat(result_data['finished_at'])
+        results_data.append(result_data)
+        details[submission_id] = (fields[b'result'], result_data)
+
+    new_results = await queries.save_results_batch(results_data, db)
+    entry_ids = [entry_id for entry_id, fields in entries]
+
+    async with cache.pipeline() as pipe:
+        for new_result in new_results:
+            queries.queue_result_detail_writes(pipe, new_result['id'], *details[new_result['submission_id']])
+        pipe.xack(settings.RESULTS_STREAM, settings.RESULTS_STREAM_GROUP, *entry_ids)
+        pipe.xdel(settings.RESULTS_STREAM, *entry_ids)
+        await pipe.execute()
+
+    return len(new_results)
+
+
+async def write_results_safely(entries, db: Database, cache: Cache):
+    if not entries:
+        return 0
+
+    try:
+        return await write_results(entries, db, cache)
+    except TRANSIENT_ERRORS:
+        raise
+    except Exception as e:
+        if len(entries) > 1:
+            return sum([await write_results_safely([entry], db, cache) for entry in entries])
+
+        entry_id, fields = entries[0]
+        logger.error('Moving quiz result %s to %s:::dead after failed insert: %s',
+                     fields[b'submission_id'].decode(), settings.RESULTS_STREAM, e)
+
+        async with cache.pipeline() as pipe:
+            pipe.xadd(f'{settings.RESULTS_STREAM}:::dead', fields)
+            pipe.xack(settings.RESULTS_STREAM, settings.RESULTS_STREAM_GROUP, entry_id)
+            pipe.xdel(settings.RESULTS_STREAM, entry_id)
+            await pipe.execute()
+        return 0
+
+
+async def read_results_batch(cache: Cache):
+    entries = []
+    block = settings.RESULTS_WRITER_BLOCK_MS
+    window_ends_at = None
+
+    while len(entries) < settings.RESULTS_BATCH_SIZE:
+        response = await cache.xreadgroup(settings.RESULTS_STREAM_GROUP, consumer_name,
+                                          {settings.RESULTS_STREAM: '>'},
+                                          count=settings.RESULTS_BATCH_SIZE - len(entries), block=block)
+        if response:
+            entries.extend(response[0][1])
+        if not entries or not response:
+            break
+
+        if window_ends_at is None:
+            window_ends_at = monotonic() + settings.RESULTS_BATCH_WINDOW_MS / 1000
+        remaining = window_ends_at - monotonic()
+        if remaining <= 0:
+            break
+        block = max(1, int(remaining * 1000))
+
+    return entries
+
+
+async def recover_pending_results(db: Database, cache: Cache):
+    pending = await cache.xpending_range(settings.RESULTS_STREAM, settings.RESULTS_STREAM_GROUP,
+                                         settings.RESULTS_BATCH_SIZE)
+    stale_ids = [item['message_id'] for item in pending
+                 if item['time_since_delivered'] >= settings.RESULTS_WRITER_CLAIM_IDLE_MS]
+
+    if stale_ids:
+        await cache.xclaim(settings.RESULTS_STREAM, settings.RESULTS_STREAM_GROUP, consumer_name,
+                           settings.RESULTS_WRITER_CLAIM_IDLE_MS, stale_ids)
+
+    while True:
+        response = await cache.xreadgroup(settings.RESULTS_STREAM_GROUP, consumer_name,
+                                          {settings.RESULTS_STREAM: '0'}, count=settings.RESULTS_BATCH_SIZE)
+        entries = response[0][1] if response else []
+        if not entries:
+            break
+        await write_results_safely(entries, db, cache)
+
+
+async def run_results_writer(db: Database, cache: Cache):
+    while True:
+        try:
+            await ensure_results_group(cache)
+            recover_at = monotonic()
+
+            while True:
+                if monotonic() >= recover_at:
+                    await recover_pending_results(db, cache)
+                    recover_at = monotonic() + settings.RESULTS_WRITER_CLAIM_IDLE_MS / 1000
+
+                await write_results_safely(await read_results_batch(cache), db, cache)
+        except Exception as e:
+            logger.warning('Quiz results writer failed, restarting: %s', e)
+            await asyncio.sleep(1)
+
+
+async def get_results_queue_stats(cache: Cache):
+    if not settings.RESULTS_WRITE_BEHIND:
+        return {'enabled': False}
+
+    try:
+        pending = (await cache.xpending(settings.RESULTS_STREAM, settings.RESULTS_STREAM_GROUP))['pending']
+    except ResponseError:
+        pending = 0
+
+    return {
+        'enabled': True,
+        'depth': await cache.xlen(settings.RESULTS_STREAM),
+        'pending': pending,
+        'dead': await cache.xlen(f'{settings.RESULTS_STREAM}:::dead')
+    }
+
+
+async def flush_result_stats(db: Database):
+    if not result_stats_buffer:
+        return
+
+    rows = result_stats_buffer.drain()
+
+    try:
+        async with db.transaction():
+            await queries.apply_result_stats(*rows, db)
+    except BaseException:
+        result_stats_buffer.merge(*rows)
+        raise
+
+
+async def run_stats_flusher(db: Database):
+    while True:
+        await asyncio.sleep(settings.STATS_FLUSH_INTERVAL_MS / 1000)
+
+        try:
+            await flush_result_stats(db)
+        except Exception as e:
+            logger.warning('Quiz stats flush failed, keeping the deltas for the next one: %s', e)
@@ -0,0 +1,128 @@
+from fastapi import HTTPException, status
+from databases import Database
+from typing import Dict, FrozenSet, List
+from datetime import datetime
+import orjson
+
+from core.congif import settings
+from database import queries
+from database.cache import Cache
+from schemas.quiz import UserAnswer
+from utils import LRUCache, SingleFlight
+
+AnswerKey = Dict[int, FrozenSet[int]]
+
+
+def build_answer_key(instances) -> AnswerKey:
+    answer_key = dict()
+
+    for instance in instances:
+        correct_answer_ids = answer_key.setdefault(instance['question_id'], set())
+        if instance['id'] is not None:
+            correct_answer_ids.add(instance['id'])
+
+    return {question_id: frozenset(answer_ids) for question_id, answer_ids in answer_key.items()}
+
+
+def encode_answer_key(answer_key: AnswerKey) -> bytes:
+    return orjson.dumps({str(question_id): sorted(answer_ids) for question_id, answer_ids in answer_key.items()})
+
+
+def decode_answer_key(data) -> AnswerKey:
+    return {int(question_id): frozenset(answer_ids) for question_id, answer_ids in orjson.loads(data).items()}
+
+
+class AnswerKeyStore:
+    def __init__(self, max_entries: int):
+        self._local = LRUCache(max_entries)
+        self._loader = SingleFlight()
+
+    async def get(self, quiz_id: int, db: Database, cache: Cache) -> AnswerKey:
+        version = await queries.get_quiz_version(quiz_id, cache)
+        local = self._local.get(quiz_id)
+
+        if local is not None and local[0] == version:
+            return local[1]
+
+        async def load():
+            data = await queries.get_answer_key_from_cache(quiz_id, version, cache)
+
+            if data:
+                answer_key = decode_answer_key(data)
+            else:
+                answer_key = build_answer_key(await queries.get_quiz_questions_with_correct_answers(quiz_id, db))
+                await queries.save_answer_key_to_cache(quiz_id, version, encode_answer_key(answer_key), cache)
+
+            self._local.set(quiz_id, (version, answer_key))
+            return answer_key
+
+        return await self._loader.do((quiz_id, version), load)
+
+
+answer_key_store = AnswerKeyStore(settings.ANSWER_KEY_CACHE_MAX_ENTRIES)
+
+
+def score_all_or_nothing(selected: FrozenSet[int], correct: FrozenSet[int], negative_mark: float):
+    return 1.0 if selected == correct else 0.0
+
+
+def score_partial(selected: FrozenSet[int], correct: FrozenSet[int], negative_mark: float):
+    if not correct:
+        return 1.0 if not selected else 0.0
+    return max(0.0, (len(selected & correct) - len(selected - correct)) / len(correct))
+
+
+def score_negative(selected: FrozenSet[int], correct: FrozenSet[int], negative_mark: float):
+    if not selected:
+        return 0.0
+    return 1.0 if selected == correct else -negative_mark
+
+
+SCORING_MODES = {
+    'all_or_nothing': score_all_or_nothing,
+    'partial': score_partial,
+    'negative': score_negative
+}
+
+
+def grade_answers(answer_key: AnswerKey, answers: List[UserAnswer], scoring_mode: str = None,
+                  negative_mark: float = None):
+    score_question = SCORING_MODES[scoring_mode or settings.GRADING_SCORING_MODE]
+    negative_mark = settings.GRADING_NEGATIVE_MARK if negative_mark is None else negative_mark
+    selected_by_question = dict()
+
+    for answer in answers:
+        question_id = answer['question_id']
+
+        if question_id not in answer_key or question_id in selected_by_question:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                detail='User\'s answers does not correspond to the questions of the quiz')
+
+        selected = set(answer.get('answer_ids') or ())
+        if answer.get('answer_id') is not None:
+            selected.add(answer['answer_id'])
+        selected_by_question[question_id] = frozenset(selected)
+
+    user_score = 0.0
+    result_answers = []
+    not_answered = frozenset()
+
+    for question_id, correct in answer_key.items():
+        selected = selected_by_question.get(question_id, not_answered)
+        score = score_question(selected, correct, negative_mark)
+        user_score += score
+
+        result_answers.append({
+            'question_id': question_id,
+            'user_answer_ids': sorted(selected),
+            'correct_answer_ids': sorted(correct),
+            'score': score,
+            'is_correct': selected == correct
+        })
+
+    return {
+        'user_score': max(user_score, 0.0),
+        'max_score': len(answer_key),
+        'finished_at': datetime.now(),
+        'answers': result_answers
+    }
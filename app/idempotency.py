@@ -0,0 +1,80 @@
+from fastapi import HTTPException, status
+from aioredis.exceptions import RedisError
+from hashlib import sha256
+from time import monotonic
+import asyncio
+import logging
+import orjson
+
+from core.congif import settings
+from database.cache import Cache
+from utils import RawJSONResponse, SingleFlight, form_idempotency_cache_key
+
+logger = logging.getLogger(__name__)
+
+idempotent_requests = SingleFlight()
+
+
+def form_request_fingerprint(*parts) -> str:
+    return sha256(orjson.dumps(parts)).hexdigest()
+
+
+def replay_response(stored: dict):
+    return RawJSONResponse(orjson.dumps(stored['content']), status_code=stored['status_code'],
+                           headers={'Idempotent-Replayed': 'true'})
+
+
+async def wait_for_stored_response(key: str, fingerprint: str, cache: Cache):
+    waiting_until = monotonic() + settings.IDEMPOTENCY_PENDING_TTL
+
+    while monotonic() < waiting_until:
+        data = await cache.get(key)
+
+        if data is None:
+            return None
+
+        stored = orjson.loads(data)
+
+        if stored['fingerprint'] != fingerprint:
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                                detail='Idempotency-Key was already used with a different request')
+        if 'status_code' in stored:
+            return replay_response(stored)
+
+        await asyncio.sleep(settings.IDEMPOTENCY_POLL_INTERVAL)
+
+    raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                        detail='A request with the same Idempotency-Key is still in progress')
+
+
+async def run_once(key: str, fingerprint: str, handler, cache: Cache):
+    while True:
+        pending = orjson.dumps({'fingerprint': fingerprint})
+
+        if await cache.set(key, pending, ex=settings.IDEMPOTENCY_PENDING_TTL, nx=True):
+            break
+
+        response = await wait_for_stored_response(key, fingerprint, cache)
+
+        if response is not None:
+            return response
+
+    try:
+        status_code, content = await handler()
+    except BaseException:
+        await cache.delete(key)
+        raise
+
+    try:
+        await cache.set(key, orjson.dumps({'fingerprint': fingerprint, 'status_code': status_code,
+                                           'content': content}), ex=settings.IDEMPOTENCY_TTL)
+    except RedisError as e:
+        logger.warning('Unable to store response for idempotency key %s, keeping it pending: %s', key, e)
+
+    return RawJSONResponse(orjson.dumps(content), status_code=status_code)
+
+
+async def run_idempotent(user_email: str, idempotency_key: str, fingerprint: str, handler, cache: Cache):
+    key = form_idempotency_cache_key(user_email, idempotency_key)
+
+    return await idempotent_requests.do((key, fingerprint), lambda: run_once(key, fingerprint, handler, cache))
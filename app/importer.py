@@ -0,0 +1,113 @@
+from pydantic import BaseModel, ValidationError, constr
+from typing import List, Optional
+import codecs
+import json
+import csv
+
+from schemas.question import QuestionImportError
+
+
+class AnswerImport(BaseModel):
+    answer_text: constr(min_length=1, max_length=200)
+    is_correct: bool = False
+
+
+class QuestionImport(BaseModel):
+    question_text: constr(min_length=1, max_length=200)
+    answers: List[AnswerImport]
+    categories: Optional[List[constr(min_length=1, max_length=30)]] = []
+
+
+class QuestionsImportBatch:
+    def __init__(self):
+        self.lines = 0
+        self.questions = []
+        self.answers = []
+        self.categories = []
+        self.errors = []
+        self._question_texts = set()
+        self._answer_texts = set()
+
+    def add_error(self, line: int, detail: str):
+        self.errors.append(QuestionImportError(line=line, detail=detail))
+
+    def add(self, line: int, data: dict):
+        try:
+            question_data = QuestionImport(**data)
+        except (ValidationError, TypeError) as e:
+            self.add_error(line, str(e))
+            return
+
+        if len(question_data.answers) < 2:
+            self.add_error(line, 'Question must have at least two answers')
+            return
+        if not any(answer_data.is_correct for answer_data in question_data.answers):
+            self.add_error(line, 'Question must have at least one correct answer')
+            return
+        if question_data.question_text in self._question_texts:
+            self.add_error(line, 'Duplicate question_text in the imported file')
+            return
+
+        answer_texts = [answer_data.answer_text for answer_data in question_data.answers]
+        if len(set(answer_texts)) != len(answer_texts) or self._answer_texts.intersection(answer_texts):
+            self.add_error(line, 'Duplicate answer_text in the imported file')
+            return
+
+        self._question_texts.add(question_data.question_text)
+        self._answer_texts.update(answer_texts)
+
+        self.questions.append((line, question_data.question_text))
+        self.answers.extend((line, question_data.question_text, answer_data.answer_text, answer_data.is_correct)
+                            for answer_data in question_data.answers)
+        self.categories.extend((line, question_data.question_text, name) for name in set(question_data.categories))
+
+
+def parse_jsonl(file, batch: QuestionsImportBatch):
+    for line, raw_line in enumerate(codecs.iterdecode(file, 'utf-8'), start=1):
+        if not raw_line.strip():
+            continue
+        batch.lines += 1
+
+        try:
+            data = json.loads(raw_line)
+        except ValueError as e:
+            batch.add_error(line, f'Invalid JSON: {e}')
+            continue
+
+        if not isinstance(data, dict):
+            batch.add_error(line, 'Each line must be a JSON object')
+            continue
+
+        batch.add(line, data)
+
+    return batch
+
+
+def parse_csv(file, batch: QuestionsImportBatch):
+    reader = csv.DictReader(codecs.iterdecode(file, 'utf-8'), delimiter=';')
+    missing_columns = {'question_text', 'answer_text', 'is_correct'}.difference(reader.fieldnames or [])
+
+    if missing_columns:
+        batch.add_error(1, f'Missing columns: {", ".join(sorted(missing_columns))}')
+        return batch
+
+    group_line, group = None, None
+
+    for row in reader:
+        line = reader.line_num
+        batch.lines += 1
+
+        if group is None or row['question_text'] != group['question_text']:
+            if group is not None:
+                batch.add(group_line, group)
+            group_line = line
+            group = {'question_text': row['question_text'], 'answers': [], 'categories': []}
+
+        group['answers'].append({'answer_text': row['answer_text'],
+                                 'is_correct': (row['is_correct'] or '').strip().lower() in ('1', 'true', 'yes')})
+        group['categories'].extend(name.strip() for name in (row.get('categories') or '').split('|') if name.strip())
+
+    if group is not None:
+        batch.add(group_line, group)
+
+    return batch
@@ -1,36 +1,64 @@
+import asyncio
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from databases import Database
-from redis import Redis
-from aioredis import from_url
 from aiohttp import ClientSession
 
-from routers import users, questions, categories, quizzes
+from routers import users, questions, categories, quizzes, sessions, metrics
 from core.congif import settings
 from database.injections import inject_dbs
+from database.cache import Cache, create_cache, bind_tiered_caches, listen_for_invalidations
+from database.pool import instrument_pool
+from database.submissions import run_results_writer, run_stats_flusher, flush_result_stats
+from utils import jwks_store
 
-db: Database = Database(settings.POSTGRES_DATABASE_URL)
-cache: Redis = from_url(settings.REDIS_DATABASE_URL)
+db: Database = Database(settings.POSTGRES_DATABASE_URL,
+                        min_size=settings.PG_POOL_MIN_SIZE,
+                        max_size=settings.PG_POOL_MAX_SIZE,
+                        statement_cache_size=settings.PG_STATEMENT_CACHE_SIZE,
+                        command_timeout=settings.PG_COMMAND_TIMEOUT,
+                        max_queries=settings.PG_MAX_QUERIES,
+                        max_inactive_connection_lifetime=settings.PG_MAX_INACTIVE_CONNECTION_LIFETIME)
+cache: Cache = create_cache(settings.REDIS_DATABASE_URL)
 session: ClientSession = ClientSession()
 
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 
 
 @app.on_event("startup")
 async def startup():
     await db.connect()
+    instrument_pool(db)
     inject_dbs(app, db, cache)
+    bind_tiered_caches(cache)
+    app.state.invalidation_listener = asyncio.create_task(listen_for_invalidations(cache))
     app.state.session = session
+    jwks_store.bind(session)
+    app.state.jwks_refresher = asyncio.create_task(jwks_store.run_refresher(settings.JWKS_REFRESH_INTERVAL))
+    app.state.stats_flusher = asyncio.create_task(run_stats_flusher(db))
+    app.state.results_writer = None
+    if settings.RESULTS_WRITE_BEHIND:
+        app.state.results_writer = asyncio.create_task(run_results_writer(db, cache))
 
 
 @app.on_event("shutdown")
 async def shutdown():
+    app.state.jwks_refresher.cancel()
+    app.state.invalidation_listener.cancel()
+    if app.state.results_writer is not None:
+        app.state.results_writer.cancel()
+    app.state.stats_flusher.cancel()
+    await flush_result_stats(db)
     await db.disconnect()
+    await cache.close()
     await session.close()
 
 
 app.include_router(users.router, prefix='/users', tags=['users'])
 app.include_router(quizzes.user_router, prefix='/quizzes', tags=['quizzes'])
+app.include_router(sessions.router, prefix='/quiz-sessions', tags=['quiz-sessions'])
 app.include_router(quizzes.admin_router, prefix='/admin/quizzes', tags=['quizzes-for-admin'])
 app.include_router(questions.router, prefix='/admin/questions', tags=['questions-for-admin'])
 app.include_router(categories.router, prefix='/admin/categories', tags=['categories-for-admin'])
+app.include_router(metrics.router, prefix='/admin/metrics', tags=['metrics-for-admin'])
 
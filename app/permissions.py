@@ -1,29 +1,39 @@
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import HTTPBearer
-from utils import Auth0
+from hashlib import sha256
+from utils import Auth0, LRUCache
 from schemas.user import User
+from core.congif import settings
 
 token_auth_scheme = HTTPBearer()
+token_cache = LRUCache(settings.TOKEN_CACHE_MAX_ENTRIES, settings.TOKEN_CACHE_TTL)
 
 
-def get_request_user(token: str = Depends(token_auth_scheme)) -> User:
-    token_payload = Auth0.verify(token.credentials)
+async def get_request_user(request: Request, token: str = Depends(token_auth_scheme)) -> User:
+    cache_key = sha256(token.credentials.encode()).digest()
+    request_user = token_cache.get(cache_key)
 
-    return User(email=token_payload['email'], name=token_payload['name'], auth0_id=token_payload['sub'],
-                roles=token_payload['role'])
+    if request_user is None:
+        token_payload = await Auth0.verify(token.credentials)
+        request_user = User(email=token_payload['email'], name=token_payload['name'], auth0_id=token_payload['sub'],
+                            roles=token_payload['role'])
+        token_cache.set(cache_key, request_user, token_payload.get('exp'))
 
+    request.state.user = request_user
+    return request_user
 
-def is_authenticated(token: str = Depends(token_auth_scheme)):
-    Auth0.verify(token.credentials)
 
+async def is_authenticated(token: str = Depends(token_auth_scheme)):
+    await Auth0.verify(token.credentials)
 
-def is_user(request_user: User = Depends(get_request_user)):
+
+async def is_user(request_user: User = Depends(get_request_user)):
     if 'user' not in request_user.roles:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
                             detail='You don\'t have permissions to access / on this server')
 
 
-def is_admin(request_user: User = Depends(get_request_user)):
+async def is_admin(request_user: User = Depends(get_request_user)):
     if 'admin' not in request_user.roles:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
                             detail='You don\'t have permissions to access / on this server')
@@ -0,0 +1,50 @@
+"""Repopulate the Redis leaderboards from quiz results stored in Postgres.
+
+Best scores are merged into the live boards, so scores saved while the rebuild runs are kept. Boards of quizzes
+that no longer exist are deleted.
+
+Run from the app directory: python rebuild_leaderboards.py
+"""
+from databases import Database
+import asyncio
+
+from core.congif import settings
+from database import queries
+from database.cache import Cache, create_cache
+from utils import form_quiz_leaderboard_key, form_global_leaderboard_key
+
+
+async def rebuild_leaderboards(db: Database, cache: Cache):
+    quiz_boards = dict()
+    global_board = dict()
+
+    async for row in queries.iterate_best_scores(db):
+        quiz_boards.setdefault(row['quiz_id'], dict())[row['user_email']] = row['best_percent']
+        global_board[row['user_email']] = global_board.get(row['user_email'], 0.0) + row['best_percent']
+
+    quiz_ids = {item['id'] for item in await queries.get_quizzes(db)} | set(quiz_boards)
+
+    for quiz_id in sorted(quiz_ids):
+        await queries.replace_leaderboard(form_quiz_leaderboard_key(quiz_id), quiz_boards.get(quiz_id, dict()), cache)
+    await queries.replace_leaderboard(form_global_leaderboard_key(), global_board, cache)
+    stale_count = await queries.delete_stale_quiz_leaderboards(quiz_ids, cache)
+
+    return len(quiz_ids), len(global_board), stale_count
+
+
+async def main():
+    db = Database(settings.POSTGRES_DATABASE_URL)
+    cache = create_cache(settings.REDIS_DATABASE_URL)
+    await db.connect()
+
+    try:
+        quizzes_count, users_count, stale_count = await rebuild_leaderboards(db, cache)
+        print(f'Rebuilt leaderboards of {quizzes_count} quizzes for {users_count} users, '
+              f'deleted {stale_count} stale boards')
+    finally:
+        await db.disconnect()
+        await cache.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
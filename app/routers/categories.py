@@ -3,8 +3,10 @@ from databases import Database
 from typing import List
 
 from database import queries
-from database.connection import get_db
-from schemas.category import CategoryCreate, Category
+from database.connection import get_db, get_cache
+from database.cache import Cache
+from schemas.category import CategoryCreate, Category, CategoryStats
+from stats import summarize_question_stats
 from permissions import is_admin
 
 router = APIRouter()
@@ -23,15 +25,39 @@ async def create_category(data: CategoryCreate, db: Database = Depends(get_db)):
 
 
 @router.patch('/{category_id}', response_model=Category, dependencies=[Depends(is_admin)])
-async def update_category(category_id: int, data: CategoryCreate, db: Database = Depends(get_db)):
+async def update_category(category_id: int, data: CategoryCreate, db: Database = Depends(get_db),
+                          cache: Cache = Depends(get_cache)):
     result = await queries.update_category(category_id, data.dict(), db)
+    await queries.invalidate_quiz_caches(await queries.get_quiz_ids_by_category(category_id, db), cache)
     return result
 
 
 @router.delete('/{category_id}', status_code=status.HTTP_204_NO_CONTENT, dependencies=[Depends(is_admin)])
-async def delete_category(category_id: int, db: Database = Depends(get_db)):
+async def delete_category(category_id: int, db: Database = Depends(get_db), cache: Cache = Depends(get_cache)):
+    quiz_ids = await queries.get_quiz_ids_by_category(category_id, db)
     result = await queries.delete_category(category_id, db)
 
     if not result:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail=f"Category with id: {category_id} was not found")
+
+    await queries.invalidate_quiz_caches(quiz_ids, cache)
+
+
+@router.get('/{category_id}/stats', response_model=CategoryStats, dependencies=[Depends(is_admin)])
+async def get_category_stats(category_id: int, db: Database = Depends(get_db)):
+    if not any(item['id'] == category_id for item in await queries.get_categories(db)):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail=f"Category with id: {category_id} was not found")
+
+    questions_stats = [summarize_question_stats(row) for row in await queries.get_category_stats(category_id, db)]
+    attempts = sum(item['attempts'] for item in questions_stats)
+    correct = sum(item['correct'] for item in questions_stats)
+
+    return {
+        'category_id': category_id,
+        'attempts': attempts,
+        'correct': correct,
+        'correct_rate': correct / attempts if attempts else 0.0,
+        'questions': questions_stats
+    }
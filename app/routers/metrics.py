@@ -0,0 +1,36 @@
+from fastapi import APIRouter, Depends
+from databases import Database
+
+from database.connection import get_db, get_cache
+from database.cache import Cache
+from database.pool import get_pool_stats
+from database.cache import tiered_caches
+from database.submissions import get_results_queue_stats
+from permissions import is_admin, token_cache
+
+router = APIRouter()
+
+
+@router.get('', dependencies=[Depends(is_admin)])
+async def get_metrics(db: Database = Depends(get_db), cache: Cache = Depends(get_cache)):
+    return {
+        'pool': get_pool_stats(db),
+        'token_cache': token_cache.stats(),
+        'catalog_caches': {name: tiered_cache.stats() for name, tiered_cache in tiered_caches.items()},
+        'results_queue': await get_results_queue_stats(cache)
+    }
+
+
+@router.get('/caches', dependencies=[Depends(is_admin)])
+async def get_cache_metrics():
+    return {name: tiered_cache.stats() for name, tiered_cache in tiered_caches.items()}
+
+
+@router.get('/pool', dependencies=[Depends(is_admin)])
+async def get_pool_metrics(db: Database = Depends(get_db)):
+    return get_pool_stats(db)
+
+
+@router.get('/results-queue', dependencies=[Depends(is_admin)])
+async def get_results_queue_metrics(cache: Cache = Depends(get_cache)):
+    return await get_results_queue_stats(cache)
@@ -1,10 +1,16 @@
 from typing import List
-from fastapi import APIRouter, Depends, status, HTTPException
+from fastapi import APIRouter, Depends, status, HTTPException, UploadFile, File, Query
+from fastapi.responses import ORJSONResponse
+from starlette.concurrency import run_in_threadpool
+from time import perf_counter
 from databases import Database
 
-from database.connection import get_db
+from database.connection import get_db, get_cache
+from database.cache import Cache
 from database import queries
-from schemas.question import Question, QuestionWithAnswersForAdmin, QuestionCreate, BaseQuestion, AnswerCreate, Answer
+from schemas.question import Question, QuestionWithAnswersForAdmin, QuestionCreate, BaseQuestion, AnswerCreate, \
+    Answer, QuestionsImportReport
+from importer import QuestionsImportBatch, parse_jsonl, parse_csv
 from utils import parse_questions
 from permissions import is_admin
 
@@ -14,9 +20,8 @@ router = APIRouter()
 @router.get('', response_model=List[QuestionWithAnswersForAdmin], dependencies=[Depends(is_admin)])
 async def get_questions(db: Database = Depends(get_db)):
     questions = await queries.get_questions(db)
-    questions = parse_questions(questions)
 
-    return questions
+    return ORJSONResponse(parse_questions(questions))
 
 
 @router.post('', response_model=QuestionWithAnswersForAdmin, dependencies=[Depends(is_admin)])
@@ -29,6 +34,34 @@ async def create_question(data: QuestionCreate, db: Database = Depends(get_db)):
     return result
 
 
+@router.post('/import', response_model=QuestionsImportReport, dependencies=[Depends(is_admin)])
+async def import_questions(file: UploadFile = File(...),
+                           import_format: str = Query(None, alias='format', regex='^(jsonl|csv)$'),
+                           db: Database = Depends(get_db)):
+    started_at = perf_counter()
+    import_format = import_format or ('csv' if (file.filename or '').lower().endswith('.csv') else 'jsonl')
+    parse = parse_csv if import_format == 'csv' else parse_jsonl
+
+    batch = await run_in_threadpool(parse, file.file, QuestionsImportBatch())
+    created = {'questions_created': 0, 'answers_created': 0, 'categories_linked': 0}
+
+    if batch.questions:
+        query_result, rejected = await queries.import_questions(batch.questions, batch.answers, batch.categories, db)
+        created = dict(query_result)
+
+        for item in rejected:
+            if item['answer_text'] is None:
+                batch.add_error(item['line'], f"Question with question_text: {item['question_text']} already exists")
+            else:
+                batch.add_error(item['line'], f"Answer with answer_text: {item['answer_text']} already exists")
+        batch.errors.sort(key=lambda error: error.line)
+
+    elapsed = perf_counter() - started_at
+
+    return QuestionsImportReport(lines=batch.lines, errors=batch.errors, elapsed_seconds=elapsed,
+                                 lines_per_second=batch.lines / elapsed if elapsed else 0.0, **created)
+
+
 @router.get('/{id}', response_model=QuestionWithAnswersForAdmin, dependencies=[Depends(is_admin)])
 async def get_single_question(id: int, db: Database = Depends(get_db)):
     questions = await queries.get_questions(db, id)
@@ -43,75 +76,95 @@ async def get_single_question(id: int, db: Database = Depends(get_db)):
 
 
 @router.patch('/{id}', response_model=Question, dependencies=[Depends(is_admin)])
-async def update_question(id: int, data: BaseQuestion, db: Database = Depends(get_db)):
+async def update_question(id: int, data: BaseQuestion, db: Database = Depends(get_db),
+                          cache: Cache = Depends(get_cache)):
     result = await queries.update_question(id, data.dict(), db)
 
     if not result:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail=f"Question with id: {id} was not found")
 
+    await queries.invalidate_quiz_caches(await queries.get_quiz_ids_by_question(id, db), cache)
+
     return result
 
 
 @router.delete('/{id}', status_code=status.HTTP_204_NO_CONTENT, dependencies=[Depends(is_admin)])
-async def delete_question(id: int, db: Database = Depends(get_db)):
+async def delete_question(id: int, db: Database = Depends(get_db), cache: Cache = Depends(get_cache)):
+    quiz_ids = await queries.get_quiz_ids_by_question(id, db)
     result = await queries.delete_question(id, db)
 
     if not result:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail=f"Question with id: {id} was not found")
 
+    await queries.invalidate_quiz_caches(quiz_ids, cache)
+
 
 @router.post('/{question_id}/answers', response_model=Answer, dependencies=[Depends(is_admin)])
-async def create_question_answer(question_id: int, data: AnswerCreate, db: Database = Depends(get_db)):
+async def create_question_answer(question_id: int, data: AnswerCreate, db: Database = Depends(get_db),
+                                 cache: Cache = Depends(get_cache)):
     result = await queries.add_question_answer(data.dict(), question_id, db)
 
     if not result:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail=f"Question with id: {question_id} was not found")
 
+    await queries.invalidate_quiz_caches(await queries.get_quiz_ids_by_question(question_id, db), cache)
+
     return result
 
 
 @router.patch('/{question_id}/answers/{answer_id}', response_model=Answer, dependencies=[Depends(is_admin)])
 async def update_question_answer(question_id: int, answer_id: int, data: AnswerCreate,
-                                 db: Database = Depends(get_db)):
+                                 db: Database = Depends(get_db), cache: Cache = Depends(get_cache)):
     result = await queries.update_question_answer(answer_id, data.dict(), question_id, db)
 
     if not result:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail=f"Question or answer with such ids doesn't exist")
 
+    await queries.invalidate_quiz_caches(await queries.get_quiz_ids_by_question(question_id, db), cache)
+
     return result
 
 
 @router.delete('/{question_id}/answers/{answer_id}', status_code=status.HTTP_204_NO_CONTENT,
                dependencies=[Depends(is_admin)])
-async def delete_question_answer(question_id: int, answer_id: int, db: Database = Depends(get_db)):
+async def delete_question_answer(question_id: int, answer_id: int, db: Database = Depends(get_db),
+                                 cache: Cache = Depends(get_cache)):
     result = await queries.delete_question_answer(answer_id, question_id, db)
 
     if not result:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail=f"Answer with id: {answer_id} was not found")
 
+    await queries.invalidate_quiz_caches(await queries.get_quiz_ids_by_question(question_id, db), cache)
+
 
 @router.post('/{question_id}/categories/{category_id}', status_code=status.HTTP_200_OK,
              dependencies=[Depends(is_admin)])
-async def add_question_category(question_id: int, category_id: int, db: Database = Depends(get_db)):
+async def add_question_category(question_id: int, category_id: int, db: Database = Depends(get_db),
+                                cache: Cache = Depends(get_cache)):
     result = await queries.add_question_category(category_id, question_id, db)
 
     if not result:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail=f"Question or category with such ids doesn't exist")
 
+    await queries.invalidate_quiz_caches(await queries.get_quiz_ids_by_question(question_id, db), cache)
+
     return result
 
 
 @router.delete('/{question_id}/categories/{category_id}', status_code=status.HTTP_204_NO_CONTENT,
                dependencies=[Depends(is_admin)])
-async def delete_question_category(question_id: int, category_id: int, db: Database = Depends(get_db)):
+async def delete_question_category(question_id: int, category_id: int, db: Database = Depends(get_db),
+                                   cache: Cache = Depends(get_cache)):
     result = await queries.delete_question_category(category_id, question_id, db)
 
     if not result:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail=f"Question or category with such ids doesn't exist")
+
+    await queries.invalidate_quiz_caches(await queries.get_quiz_ids_by_question(question_id, db), cache)
@@ -1,22 +1,31 @@
-import os
-from fastapi import APIRouter, Depends, status, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, status, HTTPException, Query, Header, BackgroundTasks
+from fastapi.responses import Response, StreamingResponse, ORJSONResponse
 from typing import List
+from datetime import datetime
 from databases import Database
-from redis import Redis
-from copy import deepcopy
-import json
+import orjson
 
+from core.congif import settings
 from database.connection import get_db, get_cache
+from database.cache import Cache
 from database import queries
-from schemas.question import QuestionWithAnswersForUser, QuestionWithAnswersForAdmin, QuestionWithCorrectAnswer
+from schemas.question import QuestionWithAnswersForUser, QuestionWithAnswersForAdmin
 from schemas.quiz import *
 from schemas.user import User
-from utils import parse_questions, process_user_answers, form_user_cache_key, save_data_to_csv_file
+from utils import parse_result_details, result_details_to_csv, form_etag, etag_matches, \
+    RawJSONResponse, encode_results_cursor, decode_results_cursor, stream_rows_as_csv, stream_rows_as_ndjson, \
+    form_question_analysis_lock_key, form_quiz_leaderboard_key, form_global_leaderboard_key, QUIZ_RESULT_EXPORT_FIELDS
 from permissions import get_request_user, is_admin, is_user
+from grading import answer_key_store, grade_answers
+from database.submissions import submit_result
+from idempotency import run_idempotent, form_request_fingerprint
+from stats import summarize_quiz_stats, summarize_question_stats
+from analysis import run_quiz_analysis
 
 user_router = APIRouter()
 admin_router = APIRouter()
+def not_modified(etag: str):
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
 
 
 @user_router.get('', response_model=List[QuizForUser], dependencies=[Depends(is_user)])
@@ -31,26 +40,58 @@ async def get_quizzes(db: Database = Depends(get_db), request_user: User = Depen
 
 
 @admin_router.post('', response_model=QuizForAdmin, dependencies=[Depends(is_admin)])
-async def create_quiz(data: QuizCreate, db: Database = Depends(get_db)):
+async def create_quiz(data: QuizCreate, db: Database = Depends(get_db), cache: Cache = Depends(get_cache)):
     result = await queries.create_quiz(data.dict(), db)
 
     if result and 'error' in result:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
                             detail=result['error'])
 
+    await queries.invalidate_quiz_caches([result['id']], cache)
+
     return result
 
 
-@user_router.get('/results', response_model=List[QuizResult], dependencies=[Depends(is_user)])
-@admin_router.get('/results', response_model=List[QuizResult], dependencies=[Depends(is_admin)])
-async def get_quizzes_results(quiz: int = None, user: str = None, db: Database = Depends(get_db),
-                              request_user: User = Depends(get_request_user)):
+@user_router.get('/results', response_model=QuizResultsPage, dependencies=[Depends(is_user)])
+@admin_router.get('/results', response_model=QuizResultsPage, dependencies=[Depends(is_admin)])
+async def get_quizzes_results(quiz: int = None, user: str = None, finished_from: datetime = None,
+                              finished_to: datetime = None, min_score: float = None, max_score: float = None,
+                              cursor: str = None,
+                              limit: int = Query(settings.RESULTS_PAGE_DEFAULT_LIMIT, ge=1,
+                                                 le=settings.RESULTS_PAGE_MAX_LIMIT),
+                              db: Database = Depends(get_db), request_user: User = Depends(get_request_user)):
     if 'admin' not in request_user.roles:
         user = request_user.email
 
-    quizzes_results = await queries.get_quizzes_results(quiz, user, db)
+    quizzes_results = await queries.get_quizzes_results(
+        quiz, user, db, limit + 1, decode_results_cursor(cursor) if cursor else None,
+        finished_from=finished_from, finished_to=finished_to, min_score=min_score, max_score=max_score
+    )
+    next_cursor = None
+
+    if len(quizzes_results) > limit:
+        quizzes_results = quizzes_results[:limit]
+        next_cursor = encode_results_cursor(quizzes_results[-1]['finished_at'], quizzes_results[-1]['id'])
+
+    items = [{field: item[field] for field in QUIZ_RESULT_EXPORT_FIELDS} for item in quizzes_results]
+    return ORJSONResponse({'items': items, 'next_cursor': next_cursor})
+
+
+@admin_router.get('/results/export', dependencies=[Depends(is_admin)])
+async def export_quizzes_results(quiz: int = None, user: str = None, finished_from: datetime = None,
+                                 finished_to: datetime = None,
+                                 export_format: str = Query('csv', alias='format', regex='^(csv|ndjson)$'),
+                                 db: Database = Depends(get_db)):
+    rows = queries.iterate_quizzes_results(db, quiz_id=quiz, user=user, finished_from=finished_from,
+                                           finished_to=finished_to)
+
+    if export_format == 'ndjson':
+        return StreamingResponse(stream_rows_as_ndjson(rows, QUIZ_RESULT_EXPORT_FIELDS),
+                                 media_type='application/x-ndjson',
+                                 headers={'Content-Disposition': 'attachment; filename="quiz-results.ndjson"'})
 
-    return quizzes_results
+    return StreamingResponse(stream_rows_as_csv(rows, QUIZ_RESULT_EXPORT_FIELDS), media_type='text/csv',
+                             headers={'Content-Disposition': 'attachment; filename="quiz-results.csv"'})
 
 
 @user_router.get('/results/{result_id}', response_model=QuizResult, dependencies=[Depends(is_user)])
@@ -72,99 +113,219 @@ async def get_single_quiz_result(result_id: int, db: Database = Depends(get_db),
 @admin_router.get('/results/{result_id}/details', response_model=QuizResultDetailsForAdmin,
                   dependencies=[Depends(is_admin)])
 async def get_quiz_result_details(result_id: int, csv_mode: bool = False, db: Database = Depends(get_db),
-                                  cache: Redis = Depends(get_cache)):
-    quiz_result = await queries.get_quiz_result(result_id, None, db)
+                                  cache: Cache = Depends(get_cache)):
+    quiz_result_details = await queries.get_result_detail_from_cache(result_id, cache)
 
-    if len(quiz_result) != 1:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
-                            detail=f"Quiz result with id: {result_id} was not found")
-    quiz_result = QuizResult(**quiz_result[0])
+    if not quiz_result_details:
+        quiz_result = await queries.get_quiz_result_with_answers(result_id, db)
 
-    key = form_user_cache_key(quiz_result.user_email, quiz_result.quiz_id, quiz_result.finished_at)
-    quiz_result_details = await queries.get_result_detail_from_cache(key, cache)
-    print(quiz_result_details)
+        if not quiz_result:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                                detail=f"Quiz result with id: {result_id} was not found")
+
+        quiz_result_details = orjson.dumps(QuizResultDetailsForAdmin(**parse_result_details(quiz_result)).dict())
+        await queries.save_result_detail_to_cache(result_id, quiz_result_details, cache)
 
     if csv_mode:
-        filename = save_data_to_csv_file(quiz_result_details)
-        file_path = f'csv-files/{filename}'
-        if os.path.exists(file_path):
-            return FileResponse(file_path)
+        return Response(result_details_to_csv(quiz_result_details), media_type='text/csv',
+                        headers={'Content-Disposition': f'attachment; filename="details-{result_id}.csv"'})
+
+    return RawJSONResponse(quiz_result_details)
+
 
-    return json.loads(quiz_result_details)
+@user_router.get('/leaderboard', response_model=Leaderboard, dependencies=[Depends(is_user)])
+@admin_router.get('/leaderboard', response_model=Leaderboard, dependencies=[Depends(is_admin)])
+async def get_global_leaderboard(limit: int = Query(settings.LEADERBOARD_DEFAULT_LIMIT, ge=1,
+                                                    le=settings.LEADERBOARD_MAX_LIMIT),
+                                 cache: Cache = Depends(get_cache), request_user: User = Depends(get_request_user)):
+    return await queries.get_leaderboard(form_global_leaderboard_key(), limit, request_user.email, cache)
+
+
+@admin_router.get('/stats', response_model=List[QuizStats], dependencies=[Depends(is_admin)])
+async def get_quizzes_stats(db: Database = Depends(get_db)):
+    stats_rows, histogram = await queries.get_quizzes_stats(db)
+    histogram_by_quiz = dict()
+
+    for bucket in histogram:
+        histogram_by_quiz.setdefault(bucket['quiz_id'], []).append(bucket)
+
+    return [summarize_quiz_stats(row['quiz_id'], row, histogram_by_quiz.get(row['quiz_id'], []))
+            for row in stats_rows]
 
 
 @user_router.get('/{quiz_id}', response_model=QuizForUser, dependencies=[Depends(is_user)])
 @admin_router.get('/{quiz_id}', response_model=QuizForAdmin, dependencies=[Depends(is_admin)])
-async def get_single_quiz(quiz_id: int, db: Database = Depends(get_db)):
-    quizzes = await queries.get_quizzes(db, quiz_id)
+async def get_single_quiz(quiz_id: int, response: Response, db: Database = Depends(get_db),
+                          cache: Cache = Depends(get_cache), if_none_match: str = Header(None),
+                          request_user: User = Depends(get_request_user)):
+    view = 'admin' if 'admin' in request_user.roles else 'user'
+    version = await queries.get_quiz_version(quiz_id, cache)
+    etag = form_etag('quiz', quiz_id, version, view)
+
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+
+    quizzes = await queries.get_quizzes(db, quiz_id, version=version)
 
     if len(quizzes) != 1:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail=f"Quiz with id: {quiz_id} was not found")
 
+    response.headers['ETag'] = etag
     return quizzes[0]
 
 
+@admin_router.get('/{quiz_id}/stats', response_model=QuizStatsDetails, dependencies=[Depends(is_admin)])
+async def get_quiz_stats(quiz_id: int, db: Database = Depends(get_db)):
+    if not await queries.get_quizzes(db, quiz_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail=f"Quiz with id: {quiz_id} was not found")
+
+    stats_row, histogram, questions_stats = await queries.get_quiz_stats(quiz_id, db)
+    quiz_stats = summarize_quiz_stats(quiz_id, stats_row, histogram)
+    quiz_stats['questions'] = [summarize_question_stats(row) for row in questions_stats]
+
+    return quiz_stats
+
+
+@admin_router.post('/{quiz_id}/analysis', response_model=QuizAnalysis, status_code=status.HTTP_202_ACCEPTED,
+                   dependencies=[Depends(is_admin)])
+async def start_quiz_analysis(quiz_id: int, background_tasks: BackgroundTasks, db: Database = Depends(get_db),
+                              cache: Cache = Depends(get_cache)):
+    if not await queries.get_quizzes(db, quiz_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail=f"Quiz with id: {quiz_id} was not found")
+
+    if not await cache.set(form_question_analysis_lock_key(quiz_id), 1, ex=settings.QUESTION_ANALYSIS_LOCK_TTL,
+                           nx=True):
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                            detail=f"Analysis of quiz with id: {quiz_id} is already running")
+
+    background_tasks.add_task(run_quiz_analysis, quiz_id, db, cache)
+
+    return {'quiz_id': quiz_id, 'running': True, 'analyzed_at': None}
+
+
+@admin_router.get('/{quiz_id}/analysis', response_model=QuizAnalysis, dependencies=[Depends(is_admin)])
+async def get_quiz_analysis(quiz_id: int, db: Database = Depends(get_db), cache: Cache = Depends(get_cache)):
+    analysis = await queries.get_question_analysis(quiz_id, db)
+
+    return {
+        'quiz_id': quiz_id,
+        'running': await cache.get(form_question_analysis_lock_key(quiz_id)) is not None,
+        'analyzed_at': analysis[0]['analyzed_at'] if analysis else None,
+        'questions': [
+            {**row, 'distractors': orjson.loads(row['distractors']) if isinstance(row['distractors'], str)
+             else row['distractors']}
+            for row in analysis
+        ]
+    }
+
+
+@user_router.get('/{quiz_id}/leaderboard', response_model=Leaderboard, dependencies=[Depends(is_user)])
+@admin_router.get('/{quiz_id}/leaderboard', response_model=Leaderboard, dependencies=[Depends(is_admin)])
+async def get_quiz_leaderboard(quiz_id: int, limit: int = Query(settings.LEADERBOARD_DEFAULT_LIMIT, ge=1,
+                                                                le=settings.LEADERBOARD_MAX_LIMIT),
+                               cache: Cache = Depends(get_cache), request_user: User = Depends(get_request_user)):
+    leaderboard = await queries.get_leaderboard(form_quiz_leaderboard_key(quiz_id), limit, request_user.email, cache)
+    leaderboard['quiz_id'] = quiz_id
+    return leaderboard
+
+
 @admin_router.patch('/{quiz_id}', response_model=QuizForAdmin, dependencies=[Depends(is_admin)])
-async def update_quiz(quiz_id: int, data: QuizUpdate, db: Database = Depends(get_db)):
+async def update_quiz(quiz_id: int, data: QuizUpdate, db: Database = Depends(get_db),
+                      cache: Cache = Depends(get_cache)):
     result = await queries.update_quiz(quiz_id, data.dict(), db)
 
     if not result:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail=f"Quiz with id: {quiz_id} was not found")
 
+    await queries.invalidate_quiz_caches([quiz_id], cache)
+
     return result
 
 
 @admin_router.delete('/{quiz_id}', status_code=status.HTTP_204_NO_CONTENT, dependencies=[Depends(is_admin)])
-async def delete_quiz(quiz_id: int, db: Database = Depends(get_db)):
+async def delete_quiz(quiz_id: int, db: Database = Depends(get_db), cache: Cache = Depends(get_cache)):
     result = await queries.delete_quiz(quiz_id, db)
 
     if not result:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail=f"Quiz with id: {quiz_id} was not found")
 
+    await queries.invalidate_quiz_caches([quiz_id], cache)
+
 
 @user_router.get('/{quiz_id}/questions', response_model=List[QuestionWithAnswersForUser],
                  dependencies=[Depends(is_user)])
+async def get_quiz_questions_for_user(quiz_id: int, db: Database = Depends(get_db),
+                                      cache: Cache = Depends(get_cache), if_none_match: str = Header(None)):
+    version = await queries.get_quiz_version(quiz_id, cache)
+    etag = form_etag('quiz', quiz_id, version, 'questions', 'user')
+
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+
+    quiz_questions = await queries.load_quiz_questions(quiz_id, 'user', version, QuestionWithAnswersForUser, db, cache)
+    return RawJSONResponse(quiz_questions, headers={'ETag': etag})
+
+
 @admin_router.get('/{quiz_id}/questions', response_model=List[QuestionWithAnswersForAdmin],
                   dependencies=[Depends(is_admin)])
-async def get_quiz_questions(quiz_id: int, db: Database = Depends(get_db)):
-    quiz_questions = await queries.get_quiz_questions(quiz_id, db)
-    quiz_questions = parse_questions(quiz_questions)
+async def get_quiz_questions_for_admin(quiz_id: int, db: Database = Depends(get_db),
+                                       cache: Cache = Depends(get_cache), if_none_match: str = Header(None)):
+    version = await queries.get_quiz_version(quiz_id, cache)
+    etag = form_etag('quiz', quiz_id, version, 'questions', 'admin')
 
-    return quiz_questions
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+
+    quiz_questions = await queries.load_quiz_questions(quiz_id, 'admin', version, QuestionWithAnswersForAdmin, db,
+                                                       cache)
+    return RawJSONResponse(quiz_questions, headers={'ETag': etag})
 
 
 @admin_router.post('/{quiz_id}/questions', response_model=List[QuizQuestionAssociate], dependencies=[Depends(is_admin)])
-async def add_quiz_questions(quiz_id: int, data: QuizQuestionsAdd, db: Database = Depends(get_db)):
+async def add_quiz_questions(quiz_id: int, data: QuizQuestionsAdd, db: Database = Depends(get_db),
+                             cache: Cache = Depends(get_cache)):
     result = await queries.add_quiz_questions(quiz_id, data.questions, db)
+    await queries.invalidate_quiz_caches([quiz_id], cache)
     return result
 
 
 @admin_router.delete('/{quiz_id}/questions/{question_id}', status_code=status.HTTP_204_NO_CONTENT,
                      dependencies=[Depends(is_admin)])
-async def delete_quiz_question(quiz_id: int, question_id: int, db: Database = Depends(get_db)):
+async def delete_quiz_question(quiz_id: int, question_id: int, db: Database = Depends(get_db),
+                               cache: Cache = Depends(get_cache)):
     result = await queries.delete_quiz_question(quiz_id, question_id, db)
 
     if not result:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail=f"Quiz doesn't include question with id: {question_id}")
 
+    await queries.invalidate_quiz_caches([quiz_id], cache)
+
 
-# @user_router.post('/{quiz_id}/user-answers', response_model=UserQuizResult, dependencies=[Depends(is_user)])
-@user_router.post('/{quiz_id}/user-answers', dependencies=[Depends(is_user)])
+@user_router.post('/{quiz_id}/user-answers', response_model=SubmittedQuizResult, dependencies=[Depends(is_user)])
 async def process_user_result(quiz_id: int, data: UserAnswers, db: Database = Depends(get_db),
-                              cache: Redis = Depends(get_cache), request_user: User = Depends(get_request_user)):
-    quiz_questions = await queries.get_quiz_questions_with_correct_answers(quiz_id, db)
-    quiz_questions = [QuestionWithCorrectAnswer(**question).dict() for question in quiz_questions]
+                              cache: Cache = Depends(get_cache), request_user: User = Depends(get_request_user),
+                              idempotency_key: str = Header(None, max_length=255)):
+    async def handle():
+        answer_key = await answer_key_store.get(quiz_id, db, cache)
 
-    user_quiz_result = process_user_answers(quiz_questions, data.dict()['answers'])
-    user_quiz_result.quiz_id = quiz_id
-    user_quiz_result.user_email = request_user.email
+        result_data = grade_answers(answer_key, data.dict()['answers'])
+        result_data['quiz_id'] = quiz_id
+        result_data['user_email'] = request_user.email
 
-    key = form_user_cache_key(request_user.email, quiz_id, user_quiz_result.finished_at)
-    await queries.save_result_detail_to_cache(key, deepcopy(user_quiz_result), cache)
-    result = await queries.save_result_to_db(user_quiz_result.dict(), db)
+        result = await submit_result(result_data, db, cache)
+        status_code = status.HTTP_202_ACCEPTED if settings.RESULTS_WRITE_BEHIND else status.HTTP_200_OK
 
-    return result
+        return status_code, SubmittedQuizResult(**result).dict()
+
+    if idempotency_key:
+        return await run_idempotent(request_user.email, idempotency_key, form_request_fingerprint(quiz_id, data.dict()),
+                                    handle, cache)
+
+    status_code, content = await handle()
+    return RawJSONResponse(orjson.dumps(content), status_code=status_code)
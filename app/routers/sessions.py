@@ -0,0 +1,171 @@
+from fastapi import APIRouter, Depends, status, HTTPException, Path, Response
+from databases import Database
+from datetime import datetime
+from secrets import token_urlsafe
+from time import time
+import random
+import orjson
+
+from core.congif import settings
+from database.connection import get_db, get_cache
+from database.cache import Cache
+from database import queries, sessions
+from database.submissions import submit_result
+from schemas.question import QuestionWithAnswersForUser
+from schemas.quiz import SubmittedQuizResult
+from schemas.session import QuizSessionCreate, QuizSession, QuizSessionQuestion, QuizSessionAnswer
+from schemas.user import User
+from permissions import get_request_user, is_user
+from grading import answer_key_store, encode_answer_key, decode_answer_key, grade_answers
+
+router = APIRouter()
+
+
+def session_not_found(session_id: str):
+    return HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                         detail=f"Quiz session with id: {session_id} was not found")
+
+
+def session_response(session_id: str, session: dict):
+    return {
+        'id': session_id,
+        'quiz_id': session['quiz_id'],
+        'questions_count': len(session['order']),
+        'answered_count': len(session.get('answers', ())),
+        'expires_at': datetime.fromtimestamp(session['deadline'])
+    }
+
+
+async def get_own_session_header(session_id: str, request_user: User, cache: Cache):
+    session = await sessions.get_session_header(session_id, cache)
+
+    if session is None or session['user'] != request_user.email:
+        raise session_not_found(session_id)
+
+    return session
+
+
+async def prepare_session_questions(quiz_id: int, version: int, ttl: int, db: Database, cache: Cache):
+    if await sessions.refresh_session_questions(quiz_id, version, ttl, cache):
+        return
+
+    data = await queries.load_quiz_questions(quiz_id, 'user', version, QuestionWithAnswersForUser, db, cache)
+    questions = {str(item['id']): orjson.dumps(item) for item in orjson.loads(data)}
+
+    if questions:
+        await sessions.save_session_questions(quiz_id, version, questions, ttl, cache)
+
+
+@router.post('', response_model=QuizSession, dependencies=[Depends(is_user)])
+async def start_quiz_session(data: QuizSessionCreate, db: Database = Depends(get_db),
+                             cache: Cache = Depends(get_cache), request_user: User = Depends(get_request_user)):
+    if not await queries.get_quizzes(db, data.quiz_id, active=True):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail=f"Quiz with id: {data.quiz_id} was not found")
+
+    version = await queries.get_quiz_version(data.quiz_id, cache)
+    answer_key = await answer_key_store.get(data.quiz_id, db, cache)
+
+    if not answer_key:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"Quiz with id: {data.quiz_id} has no questions")
+
+    questions_count = min(data.questions_count or len(answer_key), len(answer_key), settings.QUIZ_SESSION_MAX_QUESTIONS)
+    order = random.sample(list(answer_key), questions_count)
+
+    session_id = token_urlsafe(16)
+    deadline = time() + settings.QUIZ_SESSION_TIME_LIMIT
+    ttl = settings.QUIZ_SESSION_TIME_LIMIT + settings.QUIZ_SESSION_GRACE_PERIOD
+
+    await prepare_session_questions(data.quiz_id, version, max(ttl, settings.QUIZ_QUESTIONS_CACHE_TTL), db, cache)
+    await sessions.create_session(session_id, data.quiz_id, request_user.email, version, order,
+                                  encode_answer_key({question_id: answer_key[question_id] for question_id in order}),
+                                  deadline, ttl, cache)
+
+    return session_response(session_id, {'quiz_id': data.quiz_id, 'order': order, 'deadline': int(deadline)})
+
+
+@router.get('/{session_id}', response_model=QuizSession, dependencies=[Depends(is_user)])
+async def get_quiz_session(session_id: str, cache: Cache = Depends(get_cache),
+                           request_user: User = Depends(get_request_user)):
+    session = await sessions.get_session(session_id, cache)
+
+    if session is None or session['user'] != request_user.email:
+        raise session_not_found(session_id)
+
+    return session_response(session_id, session)
+
+
+@router.get('/{session_id}/questions/{position}', response_model=QuizSessionQuestion,
+            dependencies=[Depends(is_user)])
+async def get_quiz_session_question(session_id: str, position: int = Path(..., ge=1), db: Database = Depends(get_db),
+                                    cache: Cache = Depends(get_cache), request_user: User = Depends(get_request_user)):
+    session = await get_own_session_header(session_id, request_user, cache)
+
+    if position > len(session['order']):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail=f"Quiz session has no question at position: {position}")
+
+    question_id = session['order'][position - 1]
+    question = await sessions.get_session_question(session['quiz_id'], session['version'], question_id, cache)
+
+    if question is None and await queries.get_quiz_version(session['quiz_id'], cache) == session['version']:
+        ttl = max(settings.QUIZ_SESSION_TIME_LIMIT + settings.QUIZ_SESSION_GRACE_PERIOD,
+                  settings.QUIZ_QUESTIONS_CACHE_TTL)
+        await prepare_session_questions(session['quiz_id'], session['version'], ttl, db, cache)
+        question = await sessions.get_session_question(session['quiz_id'], session['version'], question_id, cache)
+
+    if question is None:
+        raise HTTPException(status_code=status.HTTP_410_GONE,
+                            detail=f"Question with id: {question_id} is no longer available")
+
+    answer_ids = await sessions.get_session_answer(session_id, question_id, cache)
+
+    return {
+        'position': position,
+        'questions_count': len(session['order']),
+        'answer_ids': answer_ids,
+        'question': orjson.loads(question)
+    }
+
+
+@router.put('/{session_id}/answers/{question_id}', status_code=status.HTTP_204_NO_CONTENT,
+            dependencies=[Depends(is_user)])
+async def save_quiz_session_answer(session_id: str, question_id: int, data: QuizSessionAnswer,
+                                   cache: Cache = Depends(get_cache), request_user: User = Depends(get_request_user)):
+    session = await get_own_session_header(session_id, request_user, cache)
+
+    if question_id not in session['order']:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"Quiz session doesn't include question with id: {question_id}")
+
+    if time() > session['deadline']:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                            detail='Time limit of the quiz session is exceeded')
+
+    if not await sessions.save_session_answer(session_id, question_id, data.answer_ids, cache):
+        raise session_not_found(session_id)
+
+
+@router.post('/{session_id}/finish', response_model=SubmittedQuizResult, dependencies=[Depends(is_user)])
+async def finish_quiz_session(session_id: str, response: Response, db: Database = Depends(get_db),
+                              cache: Cache = Depends(get_cache), request_user: User = Depends(get_request_user)):
+    await get_own_session_header(session_id, request_user, cache)
+    session = await sessions.pop_session(session_id, cache)
+
+    if session is None:
+        raise session_not_found(session_id)
+
+    answers = [{'question_id': question_id, 'answer_ids': answer_ids}
+               for question_id, answer_ids in session['answers'].items()]
+
+    result_data = grade_answers(decode_answer_key(session['key']), answers)
+    result_data['quiz_id'] = session['quiz_id']
+    result_data['user_email'] = request_user.email
+
+    result = await submit_result(result_data, db, cache)
+
+    if settings.RESULTS_WRITE_BEHIND:
+        response.status_code = status.HTTP_202_ACCEPTED
+
+    return result
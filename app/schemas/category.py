@@ -1,4 +1,7 @@
 from pydantic import BaseModel
+from typing import List
+
+from schemas.quiz import QuestionStats
 
 
 class CategoryCreate(BaseModel):
@@ -8,3 +11,11 @@ class CategoryCreate(BaseModel):
 
 class Category(CategoryCreate):
     id: int
+
+
+class CategoryStats(BaseModel):
+    category_id: int
+    attempts: int
+    correct: int
+    correct_rate: float
+    questions: List[QuestionStats] = []
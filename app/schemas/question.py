@@ -85,3 +85,18 @@ class FullQuestion(BaseModel):
 class QuestionWithCorrectAnswer(BaseModel):
     id: int
     id_1: int
+
+
+class QuestionImportError(BaseModel):
+    line: int
+    detail: str
+
+
+class QuestionsImportReport(BaseModel):
+    lines: int
+    questions_created: int
+    answers_created: int
+    categories_linked: int
+    errors: List[QuestionImportError] = []
+    elapsed_seconds: float
+    lines_per_second: float
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr
-from typing import Optional, List
+from typing import Optional, List, Dict
 from datetime import datetime
 
 
@@ -44,7 +44,8 @@ class QuizQuestionAssociate(QuizQuestionAssociateCreate):
 
 class UserAnswer(BaseModel):
     question_id: int
-    answer_id: int
+    answer_id: Optional[int]
+    answer_ids: Optional[List[int]] = []
 
 
 class UserAnswers(BaseModel):
@@ -53,7 +54,7 @@ class UserAnswers(BaseModel):
 
 class UserQuizResult(BaseModel):
     quiz_id: int = 0
-    user_score: int = 0
+    user_score: float = 0
     max_score: int
     finished_at: datetime
     user_email: EmailStr = ''
@@ -67,17 +68,29 @@ class QuizResult(UserQuizResult):
     id: int
 
 
+class SubmittedQuizResult(UserQuizResult):
+    id: Optional[int] = None
+    submission_id: Optional[str] = None
+
+
+class QuizResultsPage(BaseModel):
+    items: List[QuizResult]
+    next_cursor: Optional[str] = None
+
+
 class QuizResultAnswer(BaseModel):
     question_id: int
-    user_answer_id: int
-    correct_answer_id: int
+    user_answer_ids: List[int] = []
+    correct_answer_ids: List[int] = []
+    score: float = 0
     is_correct: bool = False
 
 
 class QuizResultAnswerForUser(BaseModel):
     question_id: int
-    user_answer_id: int
-    correct_answer_id: int
+    user_answer_ids: List[int]
+    correct_answer_ids: List[int]
+    score: float
     is_correct: bool
 
 
@@ -91,3 +104,59 @@ class QuizResultDetailsForUser(UserQuizResult):
 
 class QuizResultDetailsInCache(QuizResultDetailsForAdmin):
     finished_at: str
+
+
+class QuizScoreBucket(BaseModel):
+    bucket: int
+    attempts: int
+
+
+class QuestionStats(BaseModel):
+    question_id: int
+    attempts: int
+    correct: int
+    correct_rate: float
+    mean_score: float
+
+
+class QuizStats(BaseModel):
+    quiz_id: int
+    attempts: int
+    mean_score: float
+    mean_percent: float
+    median_percent: Optional[float]
+    pass_rate: float
+    last_finished_at: Optional[datetime]
+
+
+class QuizStatsDetails(QuizStats):
+    histogram: List[QuizScoreBucket] = []
+    questions: List[QuestionStats] = []
+
+
+class QuestionAnalysis(BaseModel):
+    question_id: int
+    responses: int
+    difficulty: float
+    discrimination: Optional[float]
+    discrimination_index: Optional[float]
+    distractors: Dict[int, int] = {}
+
+
+class QuizAnalysis(BaseModel):
+    quiz_id: int
+    running: bool = False
+    analyzed_at: Optional[datetime]
+    questions: List[QuestionAnalysis] = []
+
+
+class LeaderboardEntry(BaseModel):
+    rank: int
+    user_email: EmailStr
+    score: float
+
+
+class Leaderboard(BaseModel):
+    quiz_id: Optional[int] = None
+    entries: List[LeaderboardEntry] = []
+    me: Optional[LeaderboardEntry] = None
@@ -0,0 +1,29 @@
+from pydantic import BaseModel, conint
+from typing import Optional, List
+from datetime import datetime
+
+from schemas.question import QuestionWithAnswersForUser
+
+
+class QuizSessionCreate(BaseModel):
+    quiz_id: int
+    questions_count: Optional[conint(ge=1)] = None
+
+
+class QuizSession(BaseModel):
+    id: str
+    quiz_id: int
+    questions_count: int
+    answered_count: int = 0
+    expires_at: datetime
+
+
+class QuizSessionQuestion(BaseModel):
+    position: int
+    questions_count: int
+    answer_ids: List[int] = []
+    question: QuestionWithAnswersForUser
+
+
+class QuizSessionAnswer(BaseModel):
+    answer_ids: List[int] = []
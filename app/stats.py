@@ -0,0 +1,134 @@
+from collections import Counter
+from typing import List
+
+from core.congif import settings
+
+
+def score_percent(user_score: float, max_score: float) -> float:
+    if not max_score:
+        return 0.0
+    return min(max(user_score / max_score * 100, 0.0), 100.0)
+
+
+def aggregate_result_stats(results: List[dict]):
+    quizzes = dict()
+    histogram = Counter()
+    questions = dict()
+
+    for result in results:
+        quiz_id = result['quiz_id']
+        if quiz_id is None:
+            continue
+
+        percent = score_percent(result['user_score'], result['max_score'])
+        quiz_row = quizzes.setdefault(quiz_id, {'quiz_id': quiz_id, 'attempts': 0, 'score_sum': 0.0,
+                                                'percent_sum': 0.0, 'last_finished_at': result['finished_at']})
+        quiz_row['attempts'] += 1
+        quiz_row['score_sum'] += result['user_score']
+        quiz_row['percent_sum'] += percent
+        quiz_row['last_finished_at'] = max(quiz_row['last_finished_at'], result['finished_at'])
+        histogram[(quiz_id, int(percent))] += 1
+
+        for answer in result['answers']:
+            question_row = questions.setdefault((quiz_id, answer['question_id']), {
+                'quiz_id': quiz_id, 'question_id': answer['question_id'], 'attempts': 0, 'correct': 0, 'score_sum': 0.0
+            })
+            question_row['attempts'] += 1
+            question_row['correct'] += int(answer['is_correct'])
+            question_row['score_sum'] += answer['score']
+
+    return (
+        [quizzes[key] for key in sorted(quizzes)],
+        [{'quiz_id': quiz_id, 'bucket': bucket, 'attempts': histogram[(quiz_id, bucket)]}
+         for quiz_id, bucket in sorted(histogram)],
+        [questions[key] for key in sorted(questions)]
+    )
+
+
+class StatsBuffer:
+    def __init__(self):
+        self._quizzes = dict()
+        self._histogram = Counter()
+        self._questions = dict()
+
+    def __bool__(self):
+        return bool(self._quizzes)
+
+    def add(self, results: List[dict]):
+        self.merge(*aggregate_result_stats(results))
+
+    def merge(self, quizzes_rows: List[dict], histogram_rows: List[dict], questions_rows: List[dict]):
+        for row in quizzes_rows:
+            quiz_row = self._quizzes.setdefault(row['quiz_id'], {**row, 'attempts': 0, 'score_sum': 0.0,
+                                                                 'percent_sum': 0.0})
+            quiz_row['attempts'] += row['attempts']
+            quiz_row['score_sum'] += row['score_sum']
+            quiz_row['percent_sum'] += row['percent_sum']
+            quiz_row['last_finished_at'] = max(quiz_row['last_finished_at'], row['last_finished_at'])
+
+        for row in histogram_rows:
+            self._histogram[(row['quiz_id'], row['bucket'])] += row['attempts']
+
+        for row in questions_rows:
+            question_row = self._questions.setdefault((row['quiz_id'], row['question_id']),
+                                                      {**row, 'attempts': 0, 'correct': 0, 'score_sum': 0.0})
+            question_row['attempts'] += row['attempts']
+            question_row['correct'] += row['correct']
+            question_row['score_sum'] += row['score_sum']
+
+    def drain(self):
+        rows = (
+            [self._quizzes[key] for key in sorted(self._quizzes)],
+            [{'quiz_id': quiz_id, 'bucket': bucket, 'attempts': self._histogram[(quiz_id, bucket)]}
+             for quiz_id, bucket in sorted(self._histogram)],
+            [self._questions[key] for key in sorted(self._questions)]
+        )
+        self._quizzes, self._histogram, self._questions = dict(), Counter(), dict()
+
+        return rows
+
+
+result_stats_buffer = StatsBuffer()
+
+
+def histogram_median(histogram: List[dict], attempts: int):
+    seen = 0
+
+    for row in histogram:
+        seen += row['attempts']
+        if seen * 2 >= attempts:
+            return float(row['bucket'])
+
+    return None
+
+
+def summarize_quiz_stats(quiz_id: int, row, histogram: List[dict], pass_percent: float = None):
+    pass_percent = settings.STATS_PASS_PERCENT if pass_percent is None else pass_percent
+    attempts = row['attempts'] if row else 0
+
+    if not attempts:
+        return {'quiz_id': quiz_id, 'attempts': 0, 'mean_score': 0.0, 'mean_percent': 0.0, 'median_percent': None,
+                'pass_rate': 0.0, 'last_finished_at': None, 'histogram': []}
+
+    passed = sum(bucket['attempts'] for bucket in histogram if bucket['bucket'] >= pass_percent)
+
+    return {
+        'quiz_id': quiz_id,
+        'attempts': attempts,
+        'mean_score': row['score_sum'] / attempts,
+        'mean_percent': row['percent_sum'] / attempts,
+        'median_percent': histogram_median(histogram, attempts),
+        'pass_rate': passed / attempts,
+        'last_finished_at': row['last_finished_at'],
+        'histogram': [{'bucket': bucket['bucket'], 'attempts': bucket['attempts']} for bucket in histogram]
+    }
+
+
+def summarize_question_stats(row):
+    return {
+        'question_id': row['question_id'],
+        'attempts': row['attempts'],
+        'correct': row['correct'],
+        'correct_rate': row['correct'] / row['attempts'] if row['attempts'] else 0.0,
+        'mean_score': row['score_sum'] / row['attempts'] if row['attempts'] else 0.0
+    }
@@ -0,0 +1,40 @@
+import asyncio
+import asyncpg
+import pytest
+import os
+
+from core.congif import settings
+
+
+async def can_connect(url: str):
+    try:
+        connection = await asyncpg.connect(url, timeout=2)
+    except (OSError, ValueError, asyncio.TimeoutError, asyncpg.PostgresError, asyncpg.InterfaceError):
+        return False
+
+    await connection.close()
+    return True
+
+
+@pytest.fixture(scope='session')
+def postgres_url():
+    url = settings.POSTGRES_DATABASE_URL
+
+    if not asyncio.run(can_connect(url)):
+        pytest.skip(f'Postgres is not reachable at {settings.PG_HOST}:{settings.PG_PORT}')
+
+    return url
+
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', 'benchmark: timing comparison, runs only with RUN_BENCHMARKS=1')
+
+
+def pytest_collection_modifyitems(config, items):
+    if os.environ.get('RUN_BENCHMARKS'):
+        return
+
+    skip_benchmark = pytest.mark.skip(reason='benchmarks run only with RUN_BENCHMARKS=1')
+    for item in items:
+        if 'benchmark' in item.keywords:
+            item.add_marker(skip_benchmark)
@@ -0,0 +1,105 @@
+from math import ceil, sqrt
+import random
+import timeit
+import pytest
+
+from analysis import analyze_item_responses, UPPER_LOWER_GROUP_FRACTION
+
+BENCHMARK_ATTEMPTS = 5000
+BENCHMARK_QUESTIONS = 20
+ANSWERS_PER_QUESTION = 4
+
+
+def python_analyze_item_responses(result_ids, question_ids, scores, is_correct, pick_question_ids, pick_answer_ids,
+                                  key_question_ids, key_answer_ids):
+    # the same statistics walked question by question over dicts, as the analysis would be without NumPy
+    attempts = dict()
+    for result_id, question_id, score, correct in zip(result_ids, question_ids, scores, is_correct):
+        attempts.setdefault(result_id, dict())[question_id] = (float(score), float(correct))
+
+    totals = {result_id: sum(score for score, _ in answers.values()) for result_id, answers in attempts.items()}
+    order = sorted(sorted(attempts), key=lambda result_id: totals[result_id])
+    group_size = max(1, ceil(len(order) * UPPER_LOWER_GROUP_FRACTION))
+    upper, lower = set(order[-group_size:]), set(order[:group_size])
+
+    responses = dict()
+    for result_id, answers in attempts.items():
+        for question_id, (score, correct) in answers.items():
+            responses.setdefault(question_id, []).append((result_id, correct, totals[result_id] - score))
+
+    keys = set(zip(key_question_ids, key_answer_ids))
+    distractors = dict()
+    for pick in zip(pick_question_ids, pick_answer_ids):
+        if pick not in keys:
+            question_distractors = distractors.setdefault(pick[0], dict())
+            question_distractors[str(pick[1])] = question_distractors.get(str(pick[1]), 0) + 1
+
+    def group_difficulty(items, group):
+        group_correct = [correct for result_id, correct, _ in items if result_id in group]
+        return sum(group_correct) / len(group_correct) if group_correct else None
+
+    analysis = []
+    for question_id in sorted(responses):
+        items = responses[question_id]
+        difficulty = sum(correct for _, correct, _ in items) / len(items)
+        rest_mean = sum(rest for _, _, rest in items) / len(items)
+        covariance = sum((correct - difficulty) * (rest - rest_mean) for _, correct, rest in items)
+        spread = sqrt(sum((correct - difficulty) ** 2 for _, correct, _ in items) *
+                      sum((rest - rest_mean) ** 2 for _, _, rest in items))
+        upper_difficulty, lower_difficulty = group_difficulty(items, upper), group_difficulty(items, lower)
+
+        analysis.append({
+            'question_id': question_id,
+            'responses': len(items),
+            'difficulty': difficulty,
+            'discrimination': covariance / spread if spread > 0 else None,
+            'discrimination_index': upper_difficulty - lower_difficulty
+            if upper_difficulty is not None and lower_difficulty is not None else None,
+            'distractors': distractors.get(question_id, dict())
+        })
+
+    return analysis
+
+
+def generate_responses(attempts: int, questions: int):
+    generator = random.Random(24)
+    result_ids, question_ids, answer_ids, is_correct = [], [], [], []
+
+    for result_id in range(attempts):
+        ability = generator.random()
+        for question_id in range(questions):
+            if generator.random() < 0.1:
+                continue
+
+            answer_id = question_id * ANSWERS_PER_QUESTION
+            if generator.random() > ability:
+                answer_id += generator.randrange(1, ANSWERS_PER_QUESTION)
+
+            result_ids.append(result_id)
+            question_ids.append(question_id)
+            answer_ids.append(answer_id)
+            is_correct.append(answer_id == question_id * ANSWERS_PER_QUESTION)
+
+    key_question_ids = list(range(questions))
+    key_answer_ids = [question_id * ANSWERS_PER_QUESTION for question_id in key_question_ids]
+    return (result_ids, question_ids, [float(correct) for correct in is_correct], is_correct, question_ids,
+            answer_ids, key_question_ids, key_answer_ids)
+
+
+@pytest.mark.benchmark
+def test_vectorized_analysis_is_faster_than_python_loops():
+    columns = generate_responses(BENCHMARK_ATTEMPTS, BENCHMARK_QUESTIONS)
+
+    vectorized_rows = analyze_item_responses(*columns)
+    python_rows = python_analyze_item_responses(*columns)
+    assert len(vectorized_rows) == len(python_rows) == BENCHMARK_QUESTIONS
+    for vectorized_row, python_row in zip(vectorized_rows, python_rows):
+        assert vectorized_row.pop('distractors') == python_row.pop('distractors')
+        assert vectorized_row == pytest.approx(python_row)
+
+    vectorized = min(timeit.repeat(lambda: analyze_item_responses(*columns), number=1, repeat=3))
+    python = min(timeit.repeat(lambda: python_analyze_item_responses(*columns), number=1, repeat=3))
+
+    print(f'\n{BENCHMARK_ATTEMPTS} attempts of {BENCHMARK_QUESTIONS} questions: '
+          f'Python {python:.3f}s, NumPy {vectorized:.3f}s')
+    assert vectorized < python
@@ -0,0 +1,59 @@
+from databases import Database
+import asyncio
+import tracemalloc
+import pytest
+
+from database import queries
+from utils import stream_rows_as_csv, stream_rows_as_ndjson, QUIZ_RESULT_EXPORT_FIELDS
+
+SEED_OFFSET = 2000000
+RESULTS = 1000000
+# the rows alone are hundreds of megabytes once materialized, a streamed export stays within a few batches
+MAX_TRACED_PEAK = 8 * 1024 * 1024
+
+SEED_SQL = f'''
+    INSERT INTO quizzes (id, title, description, is_active) VALUES ({SEED_OFFSET}, 'export quiz', '', true);
+
+    INSERT INTO quiz_results (id, user_score, max_score, finished_at, user_email, quiz_id)
+    SELECT {SEED_OFFSET} + n, n % 4, 3, now() - n * interval '1 second', 'export' || n % 5000 || '@example.com',
+           {SEED_OFFSET}
+    FROM generate_series(0, {RESULTS - 1}) AS n;
+
+    ANALYZE quiz_results;
+'''
+
+
+@pytest.fixture(scope='module')
+def seeded_db(postgres_url):
+    loop = asyncio.new_event_loop()
+    db = Database(postgres_url, force_rollback=True)
+
+    loop.run_until_complete(db.connect())
+    loop.run_until_complete(db.connection().raw_connection.execute(SEED_SQL))
+
+    yield loop, db
+
+    loop.run_until_complete(db.disconnect())
+    loop.close()
+
+
+async def consume_export(db: Database, stream_rows):
+    rows = queries.iterate_quizzes_results(db, quiz_id=SEED_OFFSET)
+    lines = 0
+
+    tracemalloc.start()
+    try:
+        async for chunk in stream_rows(rows, QUIZ_RESULT_EXPORT_FIELDS):
+            lines += chunk.count('\n' if isinstance(chunk, str) else b'\n')
+        return lines, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+@pytest.mark.parametrize('stream_rows, header_lines', [(stream_rows_as_csv, 1), (stream_rows_as_ndjson, 0)])
+def test_export_streams_in_flat_memory(seeded_db, stream_rows, header_lines):
+    loop, db = seeded_db
+    lines, peak = loop.run_until_complete(consume_export(db, stream_rows))
+
+    assert lines == RESULTS + header_lines
+    assert peak < MAX_TRACED_PEAK
@@ -0,0 +1,174 @@
+from fastapi import HTTPException
+from pydantic import BaseModel
+from typing import List, Optional
+from datetime import datetime
+import random
+import timeit
+import pytest
+
+from grading import build_answer_key, encode_answer_key, decode_answer_key, grade_answers
+
+ANSWER_KEY = {
+    1: frozenset({10}),
+    2: frozenset({20, 21}),
+    3: frozenset({30})
+}
+
+
+def scores(result):
+    return {answer['question_id']: answer['score'] for answer in result['answers']}
+
+
+def test_all_correct_answers_get_full_score():
+    answers = [{'question_id': 1, 'answer_id': 10},
+               {'question_id': 2, 'answer_ids': [21, 20]},
+               {'question_id': 3, 'answer_ids': [30]}]
+
+    result = grade_answers(ANSWER_KEY, answers, scoring_mode='all_or_nothing')
+
+    assert result['user_score'] == 3.0
+    assert result['max_score'] == 3
+    assert all(answer['is_correct'] for answer in result['answers'])
+    assert result['answers'][1]['user_answer_ids'] == [20, 21]
+    assert result['answers'][1]['correct_answer_ids'] == [20, 21]
+
+
+def test_answer_id_and_answer_ids_are_merged():
+    result = grade_answers(ANSWER_KEY, [{'question_id': 2, 'answer_id': 20, 'answer_ids': [21]}],
+                           scoring_mode='all_or_nothing')
+
+    assert scores(result) == {1: 0.0, 2: 1.0, 3: 0.0}
+
+
+def test_all_or_nothing_gives_no_credit_for_incomplete_selection():
+    result = grade_answers(ANSWER_KEY, [{'question_id': 2, 'answer_ids': [20]}], scoring_mode='all_or_nothing')
+
+    assert scores(result)[2] == 0.0
+    assert result['user_score'] == 0.0
+
+
+def test_partial_credits_correct_and_penalizes_wrong_selections():
+    answers = [{'question_id': 1, 'answer_ids': [10, 11]},
+               {'question_id': 2, 'answer_ids': [20]},
+               {'question_id': 3, 'answer_ids': [31]}]
+
+    result = grade_answers(ANSWER_KEY, answers, scoring_mode='partial')
+
+    assert scores(result) == {1: 0.0, 2: 0.5, 3: 0.0}
+    assert result['user_score'] == 0.5
+
+
+def test_partial_question_without_correct_answers():
+    answer_key = {1: frozenset()}
+
+    assert grade_answers(answer_key, [], scoring_mode='partial')['user_score'] == 1.0
+    assert grade_answers(answer_key, [{'question_id': 1, 'answer_ids': [10]}],
+                         scoring_mode='partial')['user_score'] == 0.0
+
+
+def test_negative_marks_wrong_answers_and_skips_unanswered():
+    answers = [{'question_id': 1, 'answer_id': 10},
+               {'question_id': 2, 'answer_ids': [20]}]
+
+    result = grade_answers(ANSWER_KEY, answers, scoring_mode='negative', negative_mark=0.25)
+
+    assert scores(result) == {1: 1.0, 2: -0.25, 3: 0.0}
+    assert result['user_score'] == 0.75
+
+
+def test_negative_total_is_not_below_zero():
+    answers = [{'question_id': 1, 'answer_id': 11}, {'question_id': 3, 'answer_id': 31}]
+
+    result = grade_answers(ANSWER_KEY, answers, scoring_mode='negative', negative_mark=1.0)
+
+    assert sum(scores(result).values()) == -2.0
+    assert result['user_score'] == 0.0
+
+
+@pytest.mark.parametrize('answers', [
+    [{'question_id': 4, 'answer_id': 40}],
+    [{'question_id': 1, 'answer_id': 10}, {'question_id': 1, 'answer_id': 11}]
+])
+def test_answers_not_matching_the_quiz_are_rejected(answers):
+    with pytest.raises(HTTPException) as error:
+        grade_answers(ANSWER_KEY, answers, scoring_mode='all_or_nothing')
+
+    assert error.value.status_code == 400
+
+
+def test_answer_key_is_built_from_correct_answer_rows_and_survives_encoding():
+    rows = [{'question_id': 1, 'id': 10},
+            {'question_id': 2, 'id': 20},
+            {'question_id': 2, 'id': 21},
+            {'question_id': 3, 'id': None}]
+
+    answer_key = build_answer_key(rows)
+
+    assert answer_key == {1: frozenset({10}), 2: frozenset({20, 21}), 3: frozenset()}
+    assert decode_answer_key(encode_answer_key(answer_key)) == answer_key
+
+
+class LegacyResultAnswer(BaseModel):
+    question_id: int
+    user_answer_id: int
+    correct_answer_id: Optional[int]
+    is_correct: bool = False
+
+
+class LegacyResult(BaseModel):
+    user_score: int = 0
+    max_score: int
+    finished_at: datetime
+    answers: List[LegacyResultAnswer] = []
+
+
+def legacy_process_user_answers(quiz_questions, answers):
+    # the per-question lookup grade_answers replaced: sort, align by index and build a model per answer
+    answers = sorted(answers, key=lambda answer: answer['question_id'])
+    user_result = LegacyResult(finished_at=datetime.now(), max_score=len(quiz_questions))
+
+    if len(answers) != len(quiz_questions):
+        raise HTTPException(status_code=400)
+
+    for i, answer in enumerate(answers):
+        if answer['question_id'] != quiz_questions[i]['id']:
+            raise HTTPException(status_code=400)
+
+        user_result_item = LegacyResultAnswer(question_id=answer['question_id'], user_answer_id=answer['answer_id'],
+                                              correct_answer_id=quiz_questions[i]['id_1'])
+
+        if answer['answer_id'] == quiz_questions[i]['id_1']:
+            user_result.user_score += 1
+            user_result_item.is_correct = True
+
+        user_result.answers.append(user_result_item)
+
+    return user_result
+
+
+BENCHMARK_QUESTIONS = 20
+BENCHMARK_SUBMISSIONS = 10000
+
+
+@pytest.mark.benchmark
+def test_grading_engine_is_faster_than_per_question_lookup():
+    generator = random.Random(12)
+    quiz_questions = [{'id': question_id, 'id_1': question_id * 4} for question_id in range(BENCHMARK_QUESTIONS)]
+    answer_key = {row['id']: frozenset({row['id_1']}) for row in quiz_questions}
+    submissions = [
+        generator.sample([{'question_id': question_id, 'answer_id': question_id * 4 + generator.randrange(4)}
+                          for question_id in range(BENCHMARK_QUESTIONS)], BENCHMARK_QUESTIONS)
+        for _ in range(BENCHMARK_SUBMISSIONS)
+    ]
+
+    for answers in submissions[:100]:
+        assert grade_answers(answer_key, answers, scoring_mode='all_or_nothing')['user_score'] == \
+            legacy_process_user_answers(quiz_questions, answers).user_score
+
+    legacy = min(timeit.repeat(lambda: [legacy_process_user_answers(quiz_questions, answers)
+                                        for answers in submissions], number=1, repeat=3))
+    engine = min(timeit.repeat(lambda: [grade_answers(answer_key, answers, scoring_mode='all_or_nothing')
+                                        for answers in submissions], number=1, repeat=3))
+
+    print(f'\n{BENCHMARK_SUBMISSIONS} submissions: per-question lookup {legacy:.3f}s, grading engine {engine:.3f}s')
+    assert engine < legacy
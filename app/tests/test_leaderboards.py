@@ -0,0 +1,42 @@
+import asyncio
+
+from database import queries
+from database.cache import FakeCache
+from utils import form_quiz_leaderboard_key
+
+
+class ScoringDuringRebuildCache(FakeCache):
+    # a live submission lands between staging the rebuilt board and publishing it
+    async def zadd(self, name: str, mapping):
+        added = await super().zadd(name, mapping)
+        await super().zadd(form_quiz_leaderboard_key(1), {'late@example.com': 90.0, 'user@example.com': 80.0})
+        return added
+
+
+async def rebuild_board(cache: FakeCache):
+    key = form_quiz_leaderboard_key(1)
+    await cache.zadd(key, {'user@example.com': 50.0})
+    await queries.replace_leaderboard(key, {'user@example.com': 70.0, 'other@example.com': 40.0}, cache)
+    return await cache.zrevrange(key, 0, -1, withscores=True)
+
+
+def test_rebuild_keeps_scores_saved_while_it_runs():
+    board = asyncio.run(rebuild_board(ScoringDuringRebuildCache()))
+
+    assert board == [(b'late@example.com', 90.0), (b'user@example.com', 80.0), (b'other@example.com', 40.0)]
+
+
+async def delete_stale_boards(cache: FakeCache):
+    for quiz_id in (1, 2, 3):
+        await cache.zadd(form_quiz_leaderboard_key(quiz_id), {'user@example.com': 50.0})
+
+    deleted = await queries.delete_stale_quiz_leaderboards({1, 3}, cache)
+    remaining = [key async for key in cache.scan_iter(form_quiz_leaderboard_key('*'))]
+    return deleted, sorted(remaining)
+
+
+def test_boards_of_removed_quizzes_are_deleted():
+    deleted, remaining = asyncio.run(delete_stale_boards(FakeCache()))
+
+    assert deleted == 1
+    assert remaining == [form_quiz_leaderboard_key(1).encode(), form_quiz_leaderboard_key(3).encode()]
@@ -0,0 +1,98 @@
+from fastapi import FastAPI, Depends, HTTPException, status
+from jose import jwt, jwk
+from time import perf_counter, time
+import asyncio
+import rsa
+import pytest
+
+from core.congif import settings
+from permissions import token_auth_scheme, token_cache, is_user
+from schemas.user import User
+from utils import jwks_store
+
+BENCHMARK_REQUESTS = 2000
+BENCHMARK_CONCURRENCY = 100
+
+
+def legacy_get_request_user(token: str = Depends(token_auth_scheme)) -> User:
+    # the sync chain the async dependencies replaced, with the JWKS fetch per request left out
+    rsa_key = jwks_store._keys.get(jwt.get_unverified_header(token.credentials).get('kid'))
+    token_payload = jwt.decode(token.credentials, rsa_key, algorithms=settings.ALGORITHMS,
+                               audience=settings.AUDIENCE, issuer='https://' + settings.DOMAIN + '/')
+
+    return User(email=token_payload['email'], name=token_payload['name'], auth0_id=token_payload['sub'],
+                roles=token_payload['role'])
+
+
+def legacy_is_user(request_user: User = Depends(legacy_get_request_user)):
+    if 'user' not in request_user.roles:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
+                            detail='You don\'t have permissions to access / on this server')
+
+
+def create_app():
+    app = FastAPI()
+
+    @app.get('/legacy', dependencies=[Depends(legacy_is_user)])
+    async def legacy():
+        return {}
+
+    @app.get('/current', dependencies=[Depends(is_user)])
+    async def current():
+        return {}
+
+    return app
+
+
+async def call(app: FastAPI, path: str, token: str):
+    scope = {'type': 'http', 'http_version': '1.1', 'method': 'GET', 'scheme': 'http', 'path': path,
+             'raw_path': path.encode(), 'root_path': '', 'query_string': b'', 'server': ('test', 80),
+             'client': ('test', 1), 'headers': [(b'authorization', f'Bearer {token}'.encode())]}
+    response = dict()
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            response['status'] = message['status']
+
+    await app(scope, receive, send)
+    return response['status']
+
+
+async def run_requests(app: FastAPI, path: str, token: str):
+    semaphore = asyncio.Semaphore(BENCHMARK_CONCURRENCY)
+
+    async def limited_call():
+        async with semaphore:
+            return await call(app, path, token)
+
+    started_at = perf_counter()
+    statuses = await asyncio.gather(*[limited_call() for _ in range(BENCHMARK_REQUESTS)])
+    return perf_counter() - started_at, statuses
+
+
+@pytest.mark.benchmark
+def test_async_auth_path_is_faster_than_sync_chain(monkeypatch):
+    monkeypatch.setattr(settings, 'DOMAIN', 'benchmark.example.com')
+    monkeypatch.setattr(settings, 'AUDIENCE', 'benchmark')
+    monkeypatch.setattr(settings, 'ALGORITHMS', 'RS256')
+    monkeypatch.setattr(jwks_store, '_keys', jwks_store._keys)
+    monkeypatch.setattr(jwks_store, '_fetched_at', jwks_store._fetched_at)
+    public_key, private_key = rsa.newkeys(2048)
+    jwks_store._load({'keys': [{**jwk.construct(public_key.save_pkcs1().decode(), 'RS256').to_dict(),
+                                'kid': 'benchmark'}]})
+    token = jwt.encode({'sub': 'auth0|benchmark', 'email': 'benchmark@example.com', 'name': 'Benchmark',
+                        'role': ['user'], 'aud': 'benchmark', 'iss': 'https://benchmark.example.com/',
+                        'exp': int(time()) + 600},
+                       private_key.save_pkcs1().decode(), algorithm='RS256', headers={'kid': 'benchmark'})
+    app = create_app()
+
+    legacy, legacy_statuses = asyncio.run(run_requests(app, '/legacy', token))
+    current, current_statuses = asyncio.run(run_requests(app, '/current', token))
+    token_cache.clear()
+
+    print(f'\n{BENCHMARK_REQUESTS} requests: sync chain {legacy:.3f}s, async chain {current:.3f}s')
+    assert set(legacy_statuses) == set(current_statuses) == {200}
+    assert current < legacy
@@ -0,0 +1,101 @@
+from fastapi import HTTPException
+from databases import Database
+from uuid import uuid4
+import asyncio
+
+from database import queries
+from database.pool import get_pool_stats
+
+POOL_SIZE = 5
+BURSTS = 5
+CONCURRENCY = 20
+
+
+def run_in_task(coroutine):
+    # databases hands the parent's connection to child tasks, so each call gets a task and a connection of its own
+    return asyncio.ensure_future(coroutine)
+
+
+def question_data(question_text: str, *answer_texts: str):
+    return {
+        'question_text': question_text,
+        'answers': [{'answer_text': answer_text, 'is_correct': index == 0}
+                    for index, answer_text in enumerate(answer_texts)]
+    }
+
+
+def quiz_data(title: str, questions=()):
+    return {'title': title, 'description': 'Pool health check', 'is_active': True, 'questions': list(questions)}
+
+
+async def assert_pool_is_healthy(db: Database):
+    assert get_pool_stats(db)['in_use'] == 0
+
+    pool = db._backend._pool
+    connections = [await pool.acquire() for _ in range(pool.get_size())]
+
+    try:
+        for connection in connections:
+            assert not connection.is_in_transaction()
+            assert await connection.fetchval('SELECT 1') == 1
+    finally:
+        for connection in connections:
+            await pool.release(connection)
+
+
+async def fail_concurrently(calls):
+    outcomes = await asyncio.gather(*[run_in_task(call) for call in calls], return_exceptions=True)
+
+    for outcome in outcomes:
+        assert isinstance(outcome, HTTPException) and outcome.status_code == 400, outcome
+
+
+async def run_failure_bursts(url: str, prefix: str):
+    db = Database(url, min_size=2, max_size=POOL_SIZE)
+    await db.connect()
+
+    try:
+        existing_question = await run_in_task(queries.create_question(
+            question_data(f'{prefix} question', f'{prefix} answer 1', f'{prefix} answer 2'), db))
+        await run_in_task(queries.create_quiz(quiz_data(f'{prefix} quiz'), db))
+
+        for burst in range(BURSTS):
+            await fail_concurrently(
+                [queries.create_question(question_data(f'{prefix} question', f'{prefix} {burst} {call} 1',
+                                                       f'{prefix} {burst} {call} 2'), db)
+                 for call in range(CONCURRENCY // 2)] +
+                [queries.create_question(question_data(f'{prefix} {burst} {call}', f'{prefix} answer 1',
+                                                       f'{prefix} {burst} {call} 2'), db)
+                 for call in range(CONCURRENCY // 2)])
+            await assert_pool_is_healthy(db)
+
+            await fail_concurrently(
+                [queries.create_quiz(quiz_data(f'{prefix} quiz'), db) for _ in range(CONCURRENCY // 2)] +
+                [queries.create_quiz(quiz_data(f'{prefix} quiz {burst} {call}', [existing_question['id'], -1]), db)
+                 for call in range(CONCURRENCY // 2)])
+            await assert_pool_is_healthy(db)
+
+        new_question = await run_in_task(queries.create_question(
+            question_data(f'{prefix} after bursts', f'{prefix} after 1', f'{prefix} after 2'), db))
+        assert len(new_question['answers']) == 2
+
+        question_without_answers = await run_in_task(queries.create_question(
+            question_data(f'{prefix} without answers'), db))
+        assert question_without_answers['answers'] == []
+
+        quizzes_created = await run_in_task(db.fetch_val('SELECT count(*) FROM quizzes WHERE title LIKE :prefix',
+                                                         values={'prefix': f'{prefix} quiz %'}))
+        assert quizzes_created == 0
+
+        questions_created = await run_in_task(db.fetch_val(
+            'SELECT count(*) FROM questions WHERE question_text LIKE :prefix', values={'prefix': f'{prefix}%'}))
+        assert questions_created == 3
+    finally:
+        await run_in_task(db.execute('DELETE FROM quizzes WHERE title LIKE :prefix', values={'prefix': f'{prefix}%'}))
+        await run_in_task(db.execute('DELETE FROM questions WHERE question_text LIKE :prefix',
+                                     values={'prefix': f'{prefix}%'}))
+        await db.disconnect()
+
+
+def test_pool_stays_healthy_after_failure_bursts(postgres_url):
+    asyncio.run(run_failure_bursts(postgres_url, f'pool-health {uuid4().hex[:8]}'))
@@ -0,0 +1,270 @@
+from databases import Database
+from datetime import datetime
+from sqlalchemy import text
+import asyncio
+import orjson
+import pytest
+
+from database import queries
+from database.cache import FakeCache
+from database.submissions import submit_result
+from utils import parse_questions
+
+SEED_OFFSET = 1000000
+QUIZZES = 2000
+QUESTIONS_PER_QUIZ = 10
+RESULTS = 100000
+ANSWERS_PER_RESULT = 3
+CATEGORIES = 2000
+
+SEED_SQL = f'''
+    INSERT INTO quizzes (id, title, description, is_active)
+    SELECT {SEED_OFFSET} + n, 'explain quiz ' || n, '', true FROM generate_series(0, {QUIZZES - 1}) AS n;
+
+    INSERT INTO questions (id, question_text)
+    SELECT {SEED_OFFSET} + n, 'explain question ' || n
+    FROM generate_series(0, {QUIZZES * QUESTIONS_PER_QUIZ - 1}) AS n;
+
+    INSERT INTO answers (id, answer_text, is_correct, question_id)
+    SELECT {SEED_OFFSET} + n, 'explain answer ' || n, n % 4 = 0, {SEED_OFFSET} + n / 4
+    FROM generate_series(0, {QUIZZES * QUESTIONS_PER_QUIZ * 4 - 1}) AS n;
+
+    INSERT INTO categories (id, name, description)
+    SELECT {SEED_OFFSET} + n, 'explain category ' || n, '' FROM generate_series(0, {CATEGORIES - 1}) AS n;
+
+    INSERT INTO questions_categories (id, question_id, category_id)
+    SELECT {SEED_OFFSET} + n, {SEED_OFFSET} + n / 2, {SEED_OFFSET} + (n / 2 + n % 2 * 7) % {CATEGORIES}
+    FROM generate_series(0, {QUIZZES * QUESTIONS_PER_QUIZ * 2 - 1}) AS n;
+
+    INSERT INTO quizzes_questions (id, quiz_id, question_id)
+    SELECT {SEED_OFFSET} + n, {SEED_OFFSET} + n / {QUESTIONS_PER_QUIZ}, {SEED_OFFSET} + n
+    FROM generate_series(0, {QUIZZES * QUESTIONS_PER_QUIZ - 1}) AS n;
+
+    INSERT INTO quiz_results (id, user_score, max_score, finished_at, user_email, quiz_id)
+    SELECT {SEED_OFFSET} + n, n % {ANSWERS_PER_RESULT + 1}, {ANSWERS_PER_RESULT}, now() - n * interval '1 minute',
+           'explain' || n % 5000 || '@example.com', {SEED_OFFSET} + n % {QUIZZES}
+    FROM generate_series(0, {RESULTS - 1}) AS n;
+
+    INSERT INTO quiz_result_answers (result_id, question_id, user_answer_ids, correct_answer_ids, score, is_correct)
+    SELECT {SEED_OFFSET} + r, {SEED_OFFSET} + q, ARRAY[{SEED_OFFSET} + q * 4 + r % 4], ARRAY[{SEED_OFFSET} + q * 4],
+           (r % 4 = 0)::integer, r % 4 = 0
+    FROM (
+        SELECT n / {ANSWERS_PER_RESULT} AS r,
+               n / {ANSWERS_PER_RESULT} % {QUIZZES} * {QUESTIONS_PER_QUIZ} + n % {ANSWERS_PER_RESULT} AS q
+        FROM generate_series(0, {RESULTS * ANSWERS_PER_RESULT - 1}) AS n
+    ) AS seeded;
+
+    INSERT INTO quiz_stats (quiz_id, attempts, score_sum, percent_sum, last_finished_at)
+    SELECT {SEED_OFFSET} + n, 50, 75, 2500, now() FROM generate_series(0, {QUIZZES - 1}) AS n;
+
+    INSERT INTO quiz_score_histogram (quiz_id, bucket, attempts)
+    SELECT {SEED_OFFSET} + n / 10, n % 10, 5 FROM generate_series(0, {QUIZZES * 10 - 1}) AS n;
+
+    INSERT INTO question_stats (quiz_id, question_id, attempts, correct, score_sum)
+    SELECT {SEED_OFFSET} + n / {QUESTIONS_PER_QUIZ}, {SEED_OFFSET} + n, 50, 25, 25
+    FROM generate_series(0, {QUIZZES * QUESTIONS_PER_QUIZ - 1}) AS n;
+
+    INSERT INTO question_analysis (quiz_id, question_id, responses, difficulty, discrimination, discrimination_index,
+                                   distractors, analyzed_at)
+    SELECT {SEED_OFFSET} + n / {QUESTIONS_PER_QUIZ}, {SEED_OFFSET} + n, 50, 0.5, 0.3, 0.3, '{{}}', now()
+    FROM generate_series(0, {QUIZZES * QUESTIONS_PER_QUIZ - 1}) AS n;
+
+    ANALYZE quizzes, questions, answers, categories, questions_categories, quizzes_questions, quiz_results,
+            quiz_result_answers, quiz_stats, quiz_score_histogram, question_stats, question_analysis;
+'''
+
+QUIZ_ID = SEED_OFFSET + 7
+QUESTION_ID = SEED_OFFSET + 71
+CATEGORY_ID = SEED_OFFSET + 13
+RESULT_ID = SEED_OFFSET + 4007
+USER_EMAIL = 'explain7@example.com'
+
+
+class RecordingDatabase:
+    def __init__(self, db: Database):
+        self.db = db
+        self.queries = []
+
+    def record(self, query, values):
+        self.queries.append(text(query).bindparams(**(values or {})) if isinstance(query, str) else query)
+
+    async def fetch_all(self, query, values: dict = None):
+        self.record(query, values)
+        return await self.db.fetch_all(query=query, values=values)
+
+    async def fetch_one(self, query, values: dict = None):
+        self.record(query, values)
+        return await self.db.fetch_one(query=query, values=values)
+
+    async def fetch_val(self, query, values: dict = None, column=0):
+        self.record(query, values)
+        return await self.db.fetch_val(query=query, values=values, column=column)
+
+    async def execute(self, query, values: dict = None):
+        self.record(query, values)
+        return await self.db.execute(query=query, values=values)
+
+    def __getattr__(self, name):
+        return getattr(self.db, name)
+
+
+QUERIES = {
+    'get_questions': lambda db: queries.get_questions(db, QUESTION_ID),
+    'get_quizzes': lambda db: queries.get_quizzes(db, QUIZ_ID),
+    'get_quiz_questions': lambda db: queries.get_quiz_questions(QUIZ_ID, db),
+    'get_quiz_ids_by_question': lambda db: queries.get_quiz_ids_by_question(QUESTION_ID, db),
+    'get_quiz_ids_by_category': lambda db: queries.get_quiz_ids_by_category(CATEGORY_ID, db),
+    'get_quiz_questions_with_correct_answers':
+        lambda db: queries.get_quiz_questions_with_correct_answers(QUIZ_ID, db),
+    'get_quiz_stats': lambda db: queries.get_quiz_stats(QUIZ_ID, db),
+    'get_category_stats': lambda db: queries.get_category_stats(CATEGORY_ID, db),
+    'get_quizzes_results_by_quiz': lambda db: queries.get_quizzes_results(QUIZ_ID, None, db, limit=20),
+    'get_quizzes_results_by_user': lambda db: queries.get_quizzes_results(
+        None, USER_EMAIL, db, limit=20, cursor=(datetime.now(), RESULT_ID)),
+    'get_quiz_result': lambda db: queries.get_quiz_result(RESULT_ID, USER_EMAIL, db),
+    'get_quiz_result_with_answers': lambda db: queries.get_quiz_result_with_answers(RESULT_ID, db),
+    'get_question_analysis': lambda db: queries.get_question_analysis(QUIZ_ID, db)
+}
+
+RAW_QUERIES = {
+    'analysis_responses': (queries.ANALYSIS_RESPONSES_SQL, QUIZ_ID),
+    'analysis_picks': (queries.ANALYSIS_PICKS_SQL, QUIZ_ID),
+    'analysis_keys': (queries.ANALYSIS_KEYS_SQL, QUIZ_ID)
+}
+
+
+def find_seq_scans(plan: dict):
+    scans = [plan['Relation Name']] if plan['Node Type'] == 'Seq Scan' else []
+
+    for child in plan.get('Plans', []):
+        scans.extend(find_seq_scans(child))
+
+    return scans
+
+
+@pytest.fixture(scope='module')
+def seeded_db(postgres_url):
+    loop = asyncio.new_event_loop()
+    db = Database(postgres_url, force_rollback=True)
+
+    loop.run_until_complete(db.connect())
+    loop.run_until_complete(db.connection().raw_connection.execute(SEED_SQL))
+
+    yield loop, db
+
+    loop.run_until_complete(db.disconnect())
+    loop.close()
+
+
+async def explain(db: Database, sql: str, *args):
+    plan = await db.connection().raw_connection.fetchval(f'EXPLAIN (FORMAT JSON) {sql}', *args)
+    return orjson.loads(plan)[0]['Plan']
+
+
+async def explain_recorded(db: Database, run_query):
+    recording_db = RecordingDatabase(db)
+    await run_query(recording_db)
+    connection = db.connection()
+
+    plans = []
+    for query in recording_db.queries:
+        sql, args = connection._connection._compile(query)[:2]
+        plans.append(await explain(db, sql, *args))
+
+    return plans
+
+
+@pytest.mark.parametrize('name', QUERIES)
+def test_query_uses_indexes(seeded_db, name):
+    loop, db = seeded_db
+    plans = loop.run_until_complete(explain_recorded(db, QUERIES[name]))
+
+    assert plans
+    for plan in plans:
+        assert find_seq_scans(plan) == []
+
+
+@pytest.mark.parametrize('name', RAW_QUERIES)
+def test_raw_query_uses_indexes(seeded_db, name):
+    loop, db = seeded_db
+    plan = loop.run_until_complete(explain(db, *RAW_QUERIES[name]))
+
+    assert find_seq_scans(plan) == []
+
+
+async def load_questions_recorded(db: Database, run_query):
+    recording_db = RecordingDatabase(db)
+    questions = parse_questions(await run_query(recording_db))
+    return questions, len(recording_db.queries)
+
+
+@pytest.mark.parametrize('run_query, questions_count', [
+    (lambda db: queries.get_quiz_questions(QUIZ_ID, db), QUESTIONS_PER_QUIZ),
+    (lambda db: queries.get_questions(db, QUESTION_ID), 1)
+])
+def test_questions_load_with_answers_and_categories_in_one_query(seeded_db, run_query, questions_count):
+    loop, db = seeded_db
+    questions, queries_count = loop.run_until_complete(load_questions_recorded(db, run_query))
+
+    assert queries_count == 1
+    assert len(questions) == questions_count
+    for item in questions:
+        assert len(item['answers']) == 4
+        assert len(item['categories']) == 2
+
+
+class RecordingCache:
+    def __init__(self, cache: FakeCache):
+        self.cache = cache
+        self.round_trips = 0
+
+    def pipeline(self):
+        pipe = self.cache.pipeline()
+        execute = pipe.execute
+
+        async def execute_once():
+            self.round_trips += 1
+            return await execute()
+
+        pipe.execute = execute_once
+        return pipe
+
+    def __getattr__(self, name):
+        command = getattr(self.cache, name)
+
+        async def call(*args, **kwargs):
+            self.round_trips += 1
+            return await command(*args, **kwargs)
+
+        return call
+
+
+async def submit_recorded(db: Database):
+    recording_db = RecordingDatabase(db)
+    recording_cache = RecordingCache(FakeCache())
+    question_ids = range(SEED_OFFSET + (QUIZ_ID - SEED_OFFSET) * QUESTIONS_PER_QUIZ,
+                         SEED_OFFSET + (QUIZ_ID - SEED_OFFSET + 1) * QUESTIONS_PER_QUIZ)
+    result_data = {
+        'quiz_id': QUIZ_ID,
+        'user_email': USER_EMAIL,
+        'user_score': 1.0,
+        'max_score': QUESTIONS_PER_QUIZ,
+        'finished_at': datetime.now(),
+        'answers': [{'question_id': question_id, 'user_answer_ids': [question_id * 4],
+                     'correct_answer_ids': [question_id * 4], 'score': 1.0, 'is_correct': True}
+                    for question_id in question_ids]
+    }
+
+    result = await submit_result(result_data, recording_db, recording_cache)
+    answers_count = await db.fetch_val('SELECT count(*) FROM quiz_result_answers WHERE result_id = :result_id',
+                                       values={'result_id': result['id']})
+    return len(recording_db.queries), recording_cache.round_trips, answers_count
+
+
+def test_submission_is_one_result_insert_one_answers_insert_and_one_cache_round_trip(seeded_db):
+    loop, db = seeded_db
+    queries_count, round_trips, answers_count = loop.run_until_complete(submit_recorded(db))
+
+    assert queries_count == 2
+    assert round_trips == 1
+    assert answers_count == QUESTIONS_PER_QUIZ
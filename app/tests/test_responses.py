@@ -0,0 +1,51 @@
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+import orjson
+import timeit
+import pytest
+
+from schemas.question import QuestionWithAnswersForAdmin
+from utils import RawJSONResponse
+
+BENCHMARK_QUESTIONS = 200
+BENCHMARK_RESPONSES = 50
+
+QUESTIONS = [
+    {
+        'id': question_id,
+        'question_text': f'Benchmark question {question_id}',
+        'answers': [{'id': question_id * 4 + index, 'answer_text': f'Answer {index}', 'is_correct': index == 0}
+                    for index in range(4)],
+        'categories': [{'id': category_id, 'name': f'Category {category_id}'}
+                       for category_id in (question_id % 10, question_id % 10 + 10)]
+    }
+    for question_id in range(BENCHMARK_QUESTIONS)
+]
+
+
+def render_default():
+    # what a response_model route with the stock JSONResponse does: validate, encode, then json.dumps
+    questions = [QuestionWithAnswersForAdmin(**item) for item in QUESTIONS]
+    return JSONResponse(jsonable_encoder(questions)).body
+
+
+def render_orjson():
+    return ORJSONResponse(QUESTIONS).body
+
+
+def render_cached(data: bytes):
+    return RawJSONResponse(data).body
+
+
+@pytest.mark.benchmark
+def test_orjson_responses_are_faster_than_default_serializer():
+    cached = orjson.dumps([QuestionWithAnswersForAdmin(**item).dict() for item in QUESTIONS])
+    assert orjson.loads(render_default()) == orjson.loads(render_orjson()) == orjson.loads(render_cached(cached))
+
+    default = min(timeit.repeat(render_default, number=BENCHMARK_RESPONSES, repeat=3))
+    orjson_response = min(timeit.repeat(render_orjson, number=BENCHMARK_RESPONSES, repeat=3))
+    cached_response = min(timeit.repeat(lambda: render_cached(cached), number=BENCHMARK_RESPONSES, repeat=3))
+
+    print(f'\n{BENCHMARK_RESPONSES} responses of {BENCHMARK_QUESTIONS} questions: default {default:.3f}s, '
+          f'orjson {orjson_response:.3f}s, cached bytes {cached_response:.3f}s')
+    assert cached_response < orjson_response < default
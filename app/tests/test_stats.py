@@ -0,0 +1,37 @@
+from datetime import datetime
+
+from stats import StatsBuffer, aggregate_result_stats
+
+
+def result(quiz_id: int, user_score: float, finished_at: datetime, correct: bool):
+    return {'quiz_id': quiz_id, 'user_score': user_score, 'max_score': 2, 'finished_at': finished_at,
+            'answers': [{'question_id': 1, 'score': float(correct), 'is_correct': correct}]}
+
+
+RESULTS = [
+    result(1, 2.0, datetime(2022, 1, 1), True),
+    result(1, 1.0, datetime(2022, 1, 3), False),
+    result(2, 0.0, datetime(2022, 1, 2), False),
+    result(None, 2.0, datetime(2022, 1, 4), True)
+]
+
+
+def test_buffer_merges_submissions_into_one_delta_per_row():
+    buffer = StatsBuffer()
+
+    for item in RESULTS:
+        buffer.add([item])
+
+    assert buffer.drain() == aggregate_result_stats(RESULTS)
+    assert not buffer
+
+
+def test_failed_flush_can_be_merged_back():
+    buffer = StatsBuffer()
+    buffer.add(RESULTS[:2])
+    rows = buffer.drain()
+
+    buffer.add(RESULTS[2:])
+    buffer.merge(*rows)
+
+    assert buffer.drain() == aggregate_result_stats(RESULTS)
@@ -1,117 +1,356 @@
 from fastapi import Request, HTTPException, status
-from aiohttp import ClientSession
-from six.moves.urllib.request import urlopen
+from fastapi.responses import Response
+from aiohttp import ClientSession, ClientError, ClientTimeout
+from six.moves.urllib.parse import urlparse
+from threading import Lock
+from collections import OrderedDict
+import asyncio
+import logging
+import binascii
+import base64
+import orjson
 import json
+import csv
+import io
 from jose import jwt
 from typing import List
 from datetime import datetime
-from itertools import groupby
 from time import time
-import shutil
-import os
 
 from core.congif import settings
 from schemas.user import UserSignIn, UserSignUp, Auth0UserRegister, Auth0UserLogin
-from schemas.question import FullQuestion, QuestionWithAnswersForAdmin
-from schemas.quiz import UserAnswer, QuizResultDetailsForAdmin, QuizResultAnswer
+from schemas.quiz import QuizResultDetailsForAdmin
+
+
+logger = logging.getLogger(__name__)
 
 
 def get_session(request: Request) -> ClientSession:
     return request.app.state.session
 
 
+def load_json_list(value):
+    if value is None:
+        return []
+    if isinstance(value, (str, bytes)):
+        return orjson.loads(value)
+    return value
+
+
+class RawJSONResponse(Response):
+    media_type = 'application/json'
+
+
 def parse_questions(instances):
-    questions = [FullQuestion(**instance).dict() for instance in instances]
-    grouped_questions = groupby(questions, key=lambda item: item['id'])
-    parsed_questions = list()
-
-    for key, value in grouped_questions:
-        question = {
-            'id': key,
-            'question_text': '',
-            'categories': dict(),
-            'answers': dict()
+    return [
+        {
+            'id': instance['id'],
+            'question_text': instance['question_text'],
+            'answers': load_json_list(instance['answers']),
+            'categories': load_json_list(instance['categories'])
         }
+        for instance in instances
+    ]
+
+
+def form_result_details_cache_key(result_id):
+    key = f'quiz-result:::{result_id}:::details'
+    return key
+
+
+def parse_result_details(instances):
+    result = instances[0]
+
+    return {
+        'quiz_id': result['quiz_id'],
+        'user_score': result['user_score'],
+        'max_score': result['max_score'],
+        'finished_at': result['finished_at'],
+        'user_email': result['user_email'],
+        'answers': [
+            {
+                'question_id': instance['question_id'],
+                'user_answer_ids': instance['user_answer_ids'],
+                'correct_answer_ids': instance['correct_answer_ids'],
+                'score': instance['score'],
+                'is_correct': instance['is_correct']
+            }
+            for instance in instances if instance['question_id'] is not None
+        ]
+    }
+
+
+def form_etag(*parts):
+    return '"' + '-'.join(str(part) for part in parts) + '"'
+
+
+def etag_matches(if_none_match: str, etag: str):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+
+    return etag in (item.strip().replace('W/', '', 1) for item in if_none_match.split(','))
+
+
+def encode_results_cursor(finished_at: datetime, result_id: int):
+    cursor = f'{finished_at.isoformat()}|{result_id}'
+    return base64.urlsafe_b64encode(cursor.encode()).decode()
+
 
-        for item in value:
-            question['question_text'] = item['question_text']
-            if item['id_1'] and item['id_1'] not in question['answers']:
-                question['answers'][item['id_1']] = {
-                    'id': item['id_1'],
-                    'answer_text': item['answer_text'],
-                    'is_correct': item['is_correct']
-                }
-            if item['id_2'] and item['id_2'] not in question['categories']:
-                question['categories'][item['id_2']] = {
-                    'id': item['id_2'],
-                    'name': item['name'],
-                    'description': item['description']
-                }
-
-        question['categories'] = list(question['categories'].values())
-        question['answers'] = list(question['answers'].values())
-
-        parsed_questions.append(question)
-
-    return parsed_questions
-
-
-def process_user_answers(quiz_questions: List[QuestionWithAnswersForAdmin], answers: List[UserAnswer]):
-    answers = sorted(answers, key=lambda answer: answer['question_id'])
-    user_result = QuizResultDetailsForAdmin(
-        finished_at=datetime.now(),
-        max_score=len(quiz_questions)
-    )
-
-    if len(answers) != len(quiz_questions):
+def decode_results_cursor(cursor: str):
+    try:
+        finished_at, result_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(finished_at), int(result_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
-                            detail='The number of user\'s answers does not correspond to the number of '
-                                   'questions in the quiz')
-
-    for i, answer in enumerate(answers):
-        if answer['question_id'] != quiz_questions[i]['id']:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
-                                detail='User\'s answers does not correspond to the questions of the quiz')
-
-        user_result_item = QuizResultAnswer(
-            question_id=answer['question_id'],
-            user_answer_id=answer['answer_id'],
-            correct_answer_id=quiz_questions[i]['id_1']
-        )
+                            detail='Invalid pagination cursor')
+
+
+def form_quiz_version_cache_key(quiz_id):
+    key = f'quiz:::{quiz_id}:::version'
+    return key
+
+
+def form_quiz_questions_cache_key(quiz_id, view, version):
+    key = f'quiz:::{quiz_id}:::questions:::{view}:::{version}'
+    return key
+
+
+def form_answer_key_cache_key(quiz_id, version):
+    key = f'quiz:::{quiz_id}:::answer-key:::{version}'
+    return key
+
+
+def form_quiz_session_questions_cache_key(quiz_id, version):
+    key = f'quiz:::{quiz_id}:::session-questions:::{version}'
+    return key
+
+
+def form_question_analysis_lock_key(quiz_id):
+    key = f'quiz:::{quiz_id}:::analysis-lock'
+    return key
+
+
+def form_quiz_leaderboard_key(quiz_id):
+    key = f'leaderboard:::quiz:::{quiz_id}'
+    return key
+
 
-        if answer['answer_id'] == quiz_questions[i]['id_1']:
-            user_result.user_score += 1
-            user_result_item.is_correct = True
+def form_global_leaderboard_key():
+    key = 'leaderboard:::global'
+    return key
 
-        user_result.answers.append(user_result_item)
 
-    return user_result
+def form_idempotency_cache_key(user_email, idempotency_key):
+    key = f'idempotency:::{user_email}:::{idempotency_key}'
+    return key
 
 
-def form_user_cache_key(email, quiz_id, finished_at):
-    key = f'{email}:::{quiz_id}:::{str(finished_at)}'
+def form_quiz_session_cache_key(session_id):
+    key = f'quiz-session:::{session_id}'
     return key
 
 
-def save_data_to_csv_file(data):
-    data = QuizResultDetailsForAdmin(**json.loads(data))
-    directory = 'csv-files'
+QUIZ_RESULT_EXPORT_FIELDS = ['id', 'quiz_id', 'user_email', 'user_score', 'max_score', 'finished_at']
+
+
+def result_details_to_csv(data):
+    data = QuizResultDetailsForAdmin(**orjson.loads(data))
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=';')
+
+    writer.writerow(['quiz_id', 'user_email', 'user_score', 'max_score', 'question_id', 'user_answer_ids',
+                     'correct_answer_ids', 'score', 'is_correct', 'finished_at'])
+    for answer in data.answers:
+        writer.writerow([data.quiz_id, data.user_email, data.user_score, data.max_score, answer.question_id,
+                         ','.join(map(str, answer.user_answer_ids)), ','.join(map(str, answer.correct_answer_ids)),
+                         answer.score, answer.is_correct, data.finished_at])
+
+    return buffer.getvalue()
+
+
+async def stream_rows_as_csv(rows, fields: List[str], batch_size: int = 1000):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=';')
+    writer.writerow(fields)
+    count = 0
+
+    async for row in rows:
+        writer.writerow([row[field] for field in fields])
+        count += 1
+
+        if count % batch_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+
+    yield buffer.getvalue()
+
+
+async def stream_rows_as_ndjson(rows, fields: List[str], batch_size: int = 1000):
+    lines = []
+
+    async for row in rows:
+        lines.append(orjson.dumps({field: row[field] for field in fields}))
+
+        if len(lines) == batch_size:
+            yield b'\n'.join(lines) + b'\n'
+            lines = []
+
+    if lines:
+        yield b'\n'.join(lines) + b'\n'
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls = dict()
+
+    async def do(self, key, function):
+        future = self._calls.get(key)
+        if future is not None:
+            return await asyncio.shield(future)
+
+        future = asyncio.ensure_future(function())
+        self._calls[key] = future
+        try:
+            return await asyncio.shield(future)
+        finally:
+            if self._calls.get(key) is future:
+                del self._calls[key]
 
-    if os.path.exists(directory):
-        shutil.rmtree(directory)
-    os.mkdir(directory)
-    filename = f'details-{time().hex()}.csv'
 
-    with open(f'{directory}/{filename}', 'w') as file:
-        file.write('quiz_id;user_email;user_score;max_score;question_id;user_answer_id;'
-                   'correct_answer_id;is_correct;finished_at\n')
+class LRUCache:
+    def __init__(self, max_entries: int, ttl: float = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = Lock()
 
-        for answer in data.answers:
-            file.write(f"{data.quiz_id};{data.user_email};{data.user_score};{data.max_score};{answer.question_id};"
-                       f"{answer.user_answer_id};{answer.correct_answer_id};{answer.correct_answer_id};"
-                       f"{data.finished_at}\n")
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
 
-    return filename
+            if item is None or (item[1] is not None and item[1] <= time()):
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def set(self, key, value, expires_at: float = None):
+        if self.ttl is not None:
+            max_expires_at = time() + self.ttl
+            expires_at = max_expires_at if expires_at is None else min(expires_at, max_expires_at)
+
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        requests = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / requests if requests else 0.0
+        }
+
+
+class JWKSKeyStore:
+    def __init__(self, url: str, ttl: int, min_refresh_interval: int, fetch_timeout: float):
+        self.url = url
+        self.ttl = ttl
+        self.min_refresh_interval = min_refresh_interval
+        self.fetch_timeout = ClientTimeout(total=fetch_timeout)
+        self.session = None
+        self._keys = dict()
+        self._fetched_at = 0.0
+        self._attempted_at = 0.0
+        self._lock = None
+
+    @property
+    def is_expired(self):
+        return time() - self._fetched_at > self.ttl
+
+    def bind(self, session: ClientSession):
+        self.session = session
+
+    def _load(self, jwks):
+        self._keys = {
+            key['kid']: {
+                'kty': key['kty'],
+                'kid': key['kid'],
+                'use': key.get('use'),
+                'n': key['n'],
+                'e': key['e']
+            }
+            for key in jwks['keys']
+        }
+        self._fetched_at = time()
+
+    async def refresh(self):
+        self._attempted_at = time()
+
+        if self.url.startswith('file://'):
+            with open(urlparse(self.url).path) as file:
+                self._load(json.load(file))
+            return
+
+        async with self.session.get(self.url, timeout=self.fetch_timeout) as response:
+            response.raise_for_status()
+            self._load(await response.json(content_type=None))
+
+    async def run_refresher(self, interval: int):
+        while True:
+            try:
+                await self.refresh()
+            except (ClientError, OSError, ValueError, KeyError, asyncio.TimeoutError) as e:
+                logger.warning('Unable to refresh JWKS from %s: %s', self.url, e)
+            await asyncio.sleep(interval)
+
+    async def get_key(self, kid: str):
+        key = self._keys.get(kid)
+        if key is not None and not self.is_expired:
+            return key
+
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        if key is not None and self._lock.locked():
+            return key
+
+        async with self._lock:
+            key = self._keys.get(kid)
+            can_refresh = time() - self._attempted_at > self.min_refresh_interval
+            if (self.is_expired or key is None) and can_refresh:
+                try:
+                    await self.refresh()
+                except (ClientError, OSError, ValueError, KeyError, asyncio.TimeoutError) as e:
+                    logger.warning('Unable to refresh JWKS from %s: %s', self.url, e)
+                key = self._keys.get(kid)
+
+        return key
+
+
+jwks_store = JWKSKeyStore(settings.JWKS_URL, settings.JWKS_CACHE_TTL, settings.JWKS_MIN_REFRESH_INTERVAL,
+                          settings.JWKS_FETCH_TIMEOUT)
 
 
 class Auth0:
@@ -135,37 +374,32 @@ class Auth0:
         return result, status_code
 
     @classmethod
-    def verify(cls, token):
-        jsonurl = urlopen("https://" + settings.DOMAIN + "/.well-known/jwks.json")
-        jwks = json.loads(jsonurl.read())
-        unverified_header = jwt.get_unverified_header(token)
-        rsa_key = {}
-
-        for key in jwks["keys"]:
-            if key["kid"] == unverified_header["kid"]:
-                rsa_key = {
-                    "kty": key["kty"],
-                    "kid": key["kid"],
-                    "use": key["use"],
-                    "n": key["n"],
-                    "e": key["e"]
-                }
-        if rsa_key:
-            try:
-                payload = jwt.decode(
-                    token,
-                    rsa_key,
-                    algorithms=settings.ALGORITHMS,
-                    audience=settings.AUDIENCE,
-                    issuer="https://" + settings.DOMAIN + "/"
-                )
-            except jwt.ExpiredSignatureError:
-                raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Access token is expired')
-            except jwt.JWTClaimsError:
-                raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
-                                    detail='Incorrect claims, please check the audience and issuer')
-            except Exception:
-                raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Unable to parse access token')
+    async def verify(cls, token):
+        try:
+            unverified_header = jwt.get_unverified_header(token)
+        except jwt.JWTError:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Unable to parse access token')
+
+        rsa_key = await jwks_store.get_key(unverified_header.get('kid'))
+
+        if not rsa_key:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Unable to find appropriate key')
+
+        try:
+            payload = jwt.decode(
+                token,
+                rsa_key,
+                algorithms=settings.ALGORITHMS,
+                audience=settings.AUDIENCE,
+                issuer="https://" + settings.DOMAIN + "/"
+            )
+        except jwt.ExpiredSignatureError:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Access token is expired')
+        except jwt.JWTClaimsError:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
+                                detail='Incorrect claims, please check the audience and issuer')
+        except Exception:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Unable to parse access token')
 
         return payload
 